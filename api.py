@@ -1,8 +1,14 @@
 from fastapi import FastAPI, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Tuple
-from utils import count_tokens, split_text_into_chunks, extract_text_from_pdf, get_summary, process_document_chunks, select_relevant_document, get_answer
+from typing import List, Dict, Tuple, Optional
+from utils import count_tokens, split_text_into_chunks, extract_text_from_pdf_pypdf2, extract_text_from_pdf_gpt_async, get_summary, process_document_chunks, select_relevant_document, get_answer, get_answer_stream, get_document_store
 from io import BytesIO
+import os
+import json
+import tempfile
+from mm_doc_proc.utils.telemetry import telemetry
 
 app = FastAPI()
 
@@ -12,6 +18,8 @@ class TextRequest(BaseModel):
 class QuestionRequest(BaseModel):
     question: str
     summaries: Dict[str, str]
+    # Optional document texts, searched along with the summaries when shortlisting documents
+    documents: Optional[Dict[str, str]] = None
 
 class DocumentRequest(BaseModel):
     file_name: str
@@ -27,10 +35,26 @@ async def split_text_endpoint(request: TextRequest):
     chunks = split_text_into_chunks(request.text)
     return {"chunks": chunks}
 
+def _write_temporary_pdf(pdf_file: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+        tmp_file.write(pdf_file)
+    return tmp_file.name
+
 @app.post("/extract_text/")
 async def extract_text_endpoint(file: UploadFile = File(...)):
     pdf_file = await file.read()
-    chunks, chunk_tokens = extract_text_from_pdf(BytesIO(pdf_file))
+    chunks, chunk_tokens = await run_in_threadpool(extract_text_from_pdf_pypdf2, BytesIO(pdf_file))
+    return {"chunks": chunks, "chunk_tokens": chunk_tokens}
+
+@app.post("/extract_text_gpt/")
+async def extract_text_gpt_endpoint(file: UploadFile = File(...)):
+    pdf_file = await file.read()
+    # The ingestion pipeline reads the PDF from disk; the copy is written off the event loop
+    tmp_path = await run_in_threadpool(_write_temporary_pdf, pdf_file)
+    try:
+        chunks, chunk_tokens = await extract_text_from_pdf_gpt_async(tmp_path)
+    finally:
+        await run_in_threadpool(os.remove, tmp_path)
     return {"chunks": chunks, "chunk_tokens": chunk_tokens}
 
 @app.post("/summarize/")
@@ -45,7 +69,7 @@ async def process_chunks_endpoint(request: DocumentRequest):
 
 @app.post("/select_relevant/")
 async def select_relevant_endpoint(request: QuestionRequest):
-    most_relevant, relevance_scores = select_relevant_document(request.question, request.summaries)
+    most_relevant, relevance_scores = select_relevant_document(request.question, request.summaries, request.documents)
     return {"most_relevant": most_relevant, "relevance_scores": relevance_scores}
 
 class AnswerRequest(BaseModel):
@@ -54,5 +78,29 @@ class AnswerRequest(BaseModel):
 
 @app.post("/get_answer/")
 async def get_answer_endpoint(request: AnswerRequest):
-    answer = get_answer(request.question, request.document_text)
-    return {"answer": answer}
+    cache_stats = {}
+    answer = get_answer(request.question, request.document_text, cache_stats=cache_stats)
+    return {"answer": answer, "prompt_cache": cache_stats}
+
+@app.post("/get_answer_stream/")
+async def get_answer_stream_endpoint(request: AnswerRequest):
+    def event_stream():
+        cache_stats = {}
+        for delta in get_answer_stream(request.question, request.document_text, cache_stats=cache_stats):
+            yield f"data: {json.dumps({'delta': delta})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'prompt_cache': cache_stats})}\n\n"
+
+    # Server-sent events; the sync generator is iterated in a worker thread by Starlette
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus scrape endpoint for the LLM call telemetry of this process
+    return PlainTextResponse(telemetry.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/document_store/stats")
+async def document_store_stats_endpoint():
+    store = get_document_store()
+    if store is None:
+        return {"enabled": False}
+    return {"enabled": True, **store.stats()}
@@ -2,14 +2,13 @@ import streamlit as st
 import PyPDF2
 import os
 from io import BytesIO
-from openai import AzureOpenAI
-import tiktoken
 import json
 import tempfile
 from typing import List, Dict, Tuple
 import logging
 from configuration.config import ConfigLoader
-from utils import count_tokens, split_text_into_chunks, extract_text_from_pdf_gpt, extract_text_from_pdf_pypdf2, get_summary, process_document_chunks, select_relevant_document, get_answer
+from mm_doc_proc.utils.lexical_index import BM25Index
+from utils import count_tokens, split_text_into_chunks, extract_text_from_pdf_gpt, extract_text_from_pdf_pypdf2, get_summary, process_document_chunks, select_relevant_document, get_answer_stream
 
 # Page configuration
 st.set_page_config(
@@ -53,16 +52,8 @@ if 'config' not in st.session_state:
 
 # Configure OpenAI
 azure_config = st.session_state.config.get_azure_config()
-client = AzureOpenAI(
-    api_key=azure_config['api_key'],
-    api_version=azure_config['api_version'],
-    azure_endpoint=azure_config['azure_endpoint']
-)
 deployment_name = azure_config['deployment_name']
 
-# Initialize tokenizer
-encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-
 # Initialize session state for documents and UI control
 if 'documents' not in st.session_state:
     st.session_state.documents = {}
@@ -74,6 +65,9 @@ if 'show_answer' not in st.session_state:
     st.session_state.show_answer = False
 if 'extraction_method' not in st.session_state:
     st.session_state.extraction_method = 'PyPDF2'
+if 'lexical_index' not in st.session_state:
+    # Keyword index of this session's documents, used to shortlist them for the Researcher Agent
+    st.session_state.lexical_index = BM25Index()
     
 st.subheader("📚 Multiagent Document QnA")
 
@@ -119,7 +113,12 @@ with col1:
                         
                         # Use the selected extraction method
                         if st.session_state.extraction_method == 'GPT':
-                            chunks, chunk_tokens = extract_text_from_pdf_gpt(file_path)
+                            chunks, chunk_tokens = extract_text_from_pdf_gpt(
+                                file_path,
+                                progress_callback=lambda done, total: progress_bar.progress(
+                                    25 + int(25 * done / total), text=f"Processed page {done}/{total}"
+                                )
+                            )
                         else:
                             chunks, chunk_tokens = extract_text_from_pdf_pypdf2(BytesIO(file.read()))
                         
@@ -183,7 +182,9 @@ with col1:
 
     if st.session_state.show_answer and question and st.session_state.documents:
         with st.spinner('🔍 Researcher Agent is analyzing document relevance...'):
-            relevant_doc, relevance_scores = select_relevant_document(question, st.session_state.summaries)
+            relevant_doc, relevance_scores = select_relevant_document(
+                question, st.session_state.summaries, st.session_state.documents, st.session_state.lexical_index
+            )
             
             st.markdown("#### 📊 Document Relevance")
             
@@ -200,22 +201,32 @@ with col1:
                         st.markdown(f"{score}%")
 
         with st.spinner('🔍 Reply Agent is generating an answer from the most relevant document...'):
-            answer = get_answer(question, st.session_state.documents[relevant_doc])
-            
             st.markdown("#### 💡 Answer")
             st.info(f"""
                 📄 Source: {relevant_doc}
                 \n📊 Document size: {st.session_state.token_counts[relevant_doc]:,} tokens
                 \n🎯 Relevance score: {relevance_scores[relevant_doc]}%
             """)
-            st.markdown(
-                f"""
-                <div style="background-color: #f0f2f6; padding: 20px; border-radius: 10px; margin: 10px 0;">
-                    {answer}
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+
+            # Render the answer as it streams in
+            answer_placeholder = st.empty()
+            answer = ""
+            cache_stats = {}
+            for delta in get_answer_stream(question, st.session_state.documents[relevant_doc], cache_stats=cache_stats):
+                answer += delta
+                answer_placeholder.markdown(
+                    f"""
+                    <div style="background-color: #f0f2f6; padding: 20px; border-radius: 10px; margin: 10px 0;">
+                        {answer}
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+            if cache_stats.get('prompt_tokens'):
+                st.caption(
+                    f"⚡ Prompt cache: {cache_stats['cached_tokens']:,} of {cache_stats['prompt_tokens']:,} "
+                    f"prompt tokens cached ({cache_stats['cached_tokens_ratio']:.0%})"
+                )
 
     with col2:
         st.markdown("#### 📑 Documents Processed")
@@ -280,6 +291,15 @@ with tab2:
         if new_max_tokens != processing_config['max_chunk_tokens']:
             st.session_state.config.update_config('document_processing', 'max_chunk_tokens', new_max_tokens)
 
+        new_store_directory = st.text_input(
+            "Document Store Directory",
+            value=processing_config.get('document_store_directory', ''),
+            help="Directory of the persistent store of extracted chunks and appendices, so that known documents are not processed again (leave empty to disable)",
+            key="doc_proc_store_directory"
+        )
+        if new_store_directory != processing_config.get('document_store_directory', ''):
+            st.session_state.config.update_config('document_processing', 'document_store_directory', new_store_directory)
+
     # Document Analysis Agent Configuration
     with st.expander("📊 Document Analysis Agent"):
         doc_analysis_config = st.session_state.config.get_agent_config('document_analysis_agent')
@@ -380,6 +400,28 @@ with tab2:
             if new_temperature != researcher_config['temperature']:
                 st.session_state.config.update_config('researcher_agent', 'temperature', new_temperature)
 
+        new_shortlist_size = st.number_input(
+            "Shortlist Size",
+            min_value=0,
+            max_value=500,
+            value=researcher_config.get('shortlist_size', 0),
+            help="Number of documents shortlisted by a local keyword search before the agent scores them (0 = score all documents)",
+            key="researcher_shortlist_size"
+        )
+        if new_shortlist_size != researcher_config.get('shortlist_size', 0):
+            st.session_state.config.update_config('researcher_agent', 'shortlist_size', new_shortlist_size)
+
+        new_shard_max_tokens = st.number_input(
+            "Shard Token Budget",
+            min_value=1000,
+            max_value=200000,
+            value=researcher_config.get('shard_max_tokens', 16000),
+            help="Maximum tokens of appendices per Researcher Agent request; more documents are scored in parallel shards, and the best of each shard in a final round (at most max_rounds rounds in total, so about two requests' latency by default)",
+            key="researcher_shard_max_tokens"
+        )
+        if new_shard_max_tokens != researcher_config.get('shard_max_tokens', 16000):
+            st.session_state.config.update_config('researcher_agent', 'shard_max_tokens', new_shard_max_tokens)
+
     # Reply Agent Configuration
     with st.expander("💡 Reply Agent"):
         reply_config = st.session_state.config.get_agent_config('reply_agent')
@@ -430,6 +472,15 @@ with tab2:
             if new_temperature != reply_config['temperature']:
                 st.session_state.config.update_config('reply_agent', 'temperature', new_temperature)
 
+        new_warm_up = st.checkbox(
+            "Warm Up Prompt Cache on Upload",
+            value=reply_config.get('warm_up_prompt_cache', False),
+            help="Send each uploaded document to the Reply Agent once, so that the first question on it is served from the prompt cache (faster and cheaper)",
+            key="reply_warm_up_prompt_cache"
+        )
+        if new_warm_up != reply_config.get('warm_up_prompt_cache', False):
+            st.session_state.config.update_config('reply_agent', 'warm_up_prompt_cache', new_warm_up)
+
 
     # Model Information
     st.markdown("#### 🤖 Model Information")
@@ -14,9 +14,12 @@ class ConfigLoader:
         # Load Azure config from environment variables
         self.azure_config = {
             'api_key': os.getenv('OPENAI_API_KEY'),
-            'api_version': "2024-02-15-preview",
+            # 2024-10-21 or later reports cached prompt tokens and streams the usage
+            'api_version': "2024-10-21",
             'azure_endpoint': os.getenv('OPENAI_ENDPOINT'),
-            'deployment_name': os.getenv('OPENAI_DEPLOYMENT_NAME')
+            'deployment_name': os.getenv('OPENAI_DEPLOYMENT_NAME'),
+            # Model behind the deployment (e.g. gpt-4o), used to pick the tokenizer; defaults to the deployment name
+            'model_name': os.getenv('OPENAI_MODEL_NAME') or os.getenv('OPENAI_DEPLOYMENT_NAME')
         }
     
     def _load_config(self) -> Dict[str, Any]:
@@ -42,6 +45,10 @@ class ConfigLoader:
         """Get document processing configuration"""
         return self.config.get('document_processing', {})
     
+    def get_deployment_pool_config(self) -> Dict[str, Any]:
+        """Get the pool of extra deployments to spread the agents' calls over (empty by default)"""
+        return self.config.get('deployment_pool', {})
+    
     def get_azure_config(self) -> Dict[str, Any]:
         """Get Azure configuration"""
         return self.azure_config
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from rich.console import Console
+console = Console()
+
+
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Per-file limits of the Azure OpenAI Batch API; larger inputs are split into several batch jobs
+BATCH_MAX_FILE_BYTES = 200 * 1024 * 1024
+BATCH_MAX_REQUESTS_PER_FILE = 100000
+
+
+class BatchBackend(ABC):
+    """
+    Runs a JSONL file of chat completion requests as one offline batch job.
+
+    Each input line is {"custom_id", "method", "url", "body"}; each result line is
+    {"custom_id", "response": {"status_code", "body"}, "error"}, as in the OpenAI / Azure OpenAI Batch API.
+    """
+
+    @abstractmethod
+    def submit(self, requests_path: Path) -> str:
+        """Submit a batch input file and return the batch id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """The batch status, e.g. "in_progress" or one of BATCH_TERMINAL_STATUSES."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> List[dict]:
+        """The result lines of a finished batch, successful and failed."""
+
+    def run(self, requests_path: Path, poll_interval: float = 60) -> Dict[str, dict]:
+        """
+        Submit the batch, poll until it finishes and return the result lines by custom_id.
+        """
+        return self.run_many([requests_path], poll_interval)
+
+    def run_many(self, requests_paths: List[Path], poll_interval: float = 60) -> Dict[str, dict]:
+        """
+        Submit one batch per input file, poll until all of them finish and return their result lines by custom_id.
+        """
+        pending = []
+        for requests_path in requests_paths:
+            batch_id = self.submit(requests_path)
+            console.print(f"[bold blue]Submitted batch {batch_id}[/bold blue] ({requests_path})")
+            pending.append(batch_id)
+
+        results = {}
+        while pending:
+            still_pending = []
+            for batch_id in pending:
+                status = self.status(batch_id)
+                if status in BATCH_TERMINAL_STATUSES:
+                    console.print(f"[bold blue]Batch {batch_id} {status}[/bold blue]")
+                    results.update((result["custom_id"], result) for result in self.results(batch_id))
+                else:
+                    console.print(f"Batch {batch_id}: {status}")
+                    still_pending.append(batch_id)
+            pending = still_pending
+            if pending:
+                console.print(f"{len(pending)} batch(es) pending, checking again in {poll_interval} s...")
+                time.sleep(poll_interval)
+        return results
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    The OpenAI / Azure OpenAI Batch API. On Azure, the model must be a Global Batch deployment.
+    """
+
+    def __init__(self, client, completion_window: str = "24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: Path) -> str:
+        with open(requests_path, "rb") as f:
+            batch_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=batch_endpoint(self.client),
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> List[dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        results = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                results.extend(parse_jsonl(self.client.files.content(file_id).text))
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in for the Batch API, for tests and local runs.
+
+    Submitted files are copied to batch_directory, and the requests are answered on the first poll by
+    respond(body) -> response body (by default, a live call through the given client). The status and
+    the output JSONL are written next to the input, so a run can be inspected like a real batch.
+    """
+
+    def __init__(self, batch_directory: Union[str, os.PathLike], client=None, respond: Optional[Callable[[dict], dict]] = None):
+        self.batch_directory = Path(batch_directory)
+        self.batch_directory.mkdir(parents=True, exist_ok=True)
+        self.client = client
+        self.respond = respond or self._respond_with_client
+
+    def _respond_with_client(self, body: dict) -> dict:
+        return self.client.chat.completions.create(**body).model_dump()
+
+    def _path(self, batch_id: str, suffix: str) -> Path:
+        return self.batch_directory / f"{batch_id}_{suffix}"
+
+    def submit(self, requests_path: Path) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        self._path(batch_id, "input.jsonl").write_text(Path(requests_path).read_text(encoding="utf-8"), encoding="utf-8")
+        self._path(batch_id, "status.txt").write_text("validating", encoding="utf-8")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        status = self._path(batch_id, "status.txt").read_text(encoding="utf-8")
+        if status == "validating":
+            self._process(batch_id)
+            status = self._path(batch_id, "status.txt").read_text(encoding="utf-8")
+        return status
+
+    def _process(self, batch_id: str):
+        output_lines = []
+        for request in parse_jsonl(self._path(batch_id, "input.jsonl").read_text(encoding="utf-8")):
+            try:
+                response = {"status_code": 200, "body": self.respond(request["body"])}
+                error = None
+            except Exception as e:
+                response = None
+                error = {"code": type(e).__name__, "message": str(e)}
+            output_lines.append(json.dumps({"custom_id": request["custom_id"], "response": response, "error": error}))
+
+        self._path(batch_id, "output.jsonl").write_text("\n".join(output_lines) + "\n", encoding="utf-8")
+        self._path(batch_id, "status.txt").write_text("completed", encoding="utf-8")
+
+    def results(self, batch_id: str) -> List[dict]:
+        return parse_jsonl(self._path(batch_id, "output.jsonl").read_text(encoding="utf-8"))
+
+
+def batch_endpoint(client) -> str:
+    """Azure OpenAI batches use /chat/completions, OpenAI batches /v1/chat/completions."""
+    return "/chat/completions" if "azure" in type(client).__name__.lower() else "/v1/chat/completions"
+
+
+def parse_jsonl(text: str) -> List[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def write_batch_requests(
+    requests: Dict[str, dict],
+    requests_directory: Path,
+    name: str,
+    url: str,
+    max_file_bytes: int = BATCH_MAX_FILE_BYTES,
+    max_requests: int = BATCH_MAX_REQUESTS_PER_FILE
+) -> List[Path]:
+    """
+    Write {custom_id: request body} as batch input JSONL files named {name}_{part}_requests.jsonl,
+    starting a new file whenever the next line would take the current one over max_file_bytes or max_requests.
+    """
+    requests_directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    f = None
+    file_bytes = file_requests = 0
+    try:
+        for custom_id, body in requests.items():
+            line = (json.dumps({"custom_id": custom_id, "method": "POST", "url": url, "body": body}) + "\n").encode("utf-8")
+            if f is None or file_requests >= max_requests or (file_requests and file_bytes + len(line) > max_file_bytes):
+                if f is not None:
+                    f.close()
+                paths.append(requests_directory / f"{name}_{len(paths) + 1}_requests.jsonl")
+                f = open(paths[-1], "wb")
+                file_bytes = file_requests = 0
+            f.write(line)
+            file_bytes += len(line)
+            file_requests += 1
+    finally:
+        if f is not None:
+            f.close()
+    return paths
+
+
+def batch_result_body(result: Optional[dict]) -> Optional[dict]:
+    """
+    The response body of a successful result line, or None if the request failed or is missing.
+    """
+    if not result or result.get("error"):
+        return None
+    response = result.get("response") or {}
+    if response.get("status_code") != 200:
+        return None
+    return response.get("body")
@@ -0,0 +1,70 @@
+"""
+Benchmark: per-page fitz.open vs. one document handle per ingestion run.
+
+Reproduces the page access pattern of PDFIngestionPipeline._process_page
+without any LLM calls or rendering, so that the measured difference is only
+the cost of re-opening and re-parsing the PDF for every page.
+
+Usage:
+    python benchmark_document_handle.py [path/to/document.pdf] [--repeat N]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import fitz
+
+
+DEFAULT_PDF = Path(__file__).parent.parent / "unit_tests" / "data" / "1_London_Brochure.pdf"
+
+
+def read_pages_reopening(pdf_path):
+    """Old behaviour: open the document once per page."""
+    with fitz.open(pdf_path) as pdf:
+        total_pages = pdf.page_count
+
+    for page_number in range(1, total_pages + 1):
+        with fitz.open(pdf_path) as pdf_document:
+            page = pdf_document[page_number - 1]
+            page.get_text()
+
+    return total_pages
+
+
+def read_pages_shared_handle(pdf_path):
+    """New behaviour: open the document once and share the handle across pages."""
+    with fitz.open(pdf_path) as pdf_document:
+        total_pages = pdf_document.page_count
+        for page_number in range(1, total_pages + 1):
+            page = pdf_document[page_number - 1]
+            page.get_text()
+
+    return total_pages
+
+
+def time_run(fn, pdf_path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total_pages = fn(pdf_path)
+        timings.append(time.perf_counter() - start)
+    return min(timings), total_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_path", nargs="?", default=str(DEFAULT_PDF))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    reopen_time, total_pages = time_run(read_pages_reopening, args.pdf_path, args.repeat)
+    shared_time, _ = time_run(read_pages_shared_handle, args.pdf_path, args.repeat)
+
+    print(f"Document: {args.pdf_path} ({total_pages} pages, best of {args.repeat})")
+    print(f"Re-open per page : {reopen_time * 1000:10.2f} ms  ({reopen_time * 1000 / total_pages:.3f} ms/page)")
+    print(f"Shared handle    : {shared_time * 1000:10.2f} ms  ({shared_time * 1000 / total_pages:.3f} ms/page)")
+    print(f"Per-page open overhead removed: {(reopen_time - shared_time) * 1000 / total_pages:.3f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,9 +14,26 @@ class ProcessingPipelineConfiguration(BaseModel):
     multimodal_model: MulitmodalProcessingModelInfo = MulitmodalProcessingModelInfo()
     text_model: TextProcessingModelnfo = TextProcessingModelnfo()
     process_pages_as_jpg: bool = True
+    save_page_images: bool = True  # Write the rendered page images to disk (they are always sent to the model from memory)
+    page_image_dpi: int = Field(default=300, ge=36)
+    page_image_jpg_quality: int = Field(default=80, ge=1, le=100)
     process_text: bool = True
     process_images: bool = True
     process_tables: bool = True
+    combine_image_and_table_analysis: bool = False  # Single multimodal call per page for both images and tables
+    triage_pages: bool = False  # Skip the image/table calls on pages that local fitz heuristics show don't need them
+    triage_min_vector_drawings: int = Field(default=20, ge=0)
+    triage_min_image_area_ratio: float = Field(default=0.01, ge=0, le=1)
     save_text_files: bool = True
     generate_condensed_text: bool = True
-    generate_table_of_contents: bool = True
\ No newline at end of file
+    generate_table_of_contents: bool = True
+    max_concurrent_pages: int = Field(default=1, ge=1)  # Number of pages processed in parallel (1 = sequential)
+    resume: bool = False  # Reuse the page checkpoints of a previous, interrupted run in the same output directory
+    llm_cache_directory: Optional[str] = None  # Directory of the persistent LLM result cache (None = disabled)
+    llm_cache_max_size_mb: int = Field(default=1024, ge=1)  # Least recently used entries are evicted beyond this size
+    batch_mode: bool = False  # Run the LLM calls as offline batch jobs instead of live requests (see process_pdf_batch)
+    batch_backend: Literal["openai", "local"] = "openai"  # "local" is a file-based stand-in for testing
+    batch_poll_interval: int = Field(default=60, ge=1)  # Seconds between batch status checks
+    batch_completion_window: str = "24h"
+    batch_max_file_mb: int = Field(default=200, ge=1)  # Larger batch inputs are split into several batch jobs
+    batch_max_requests_per_file: int = Field(default=100000, ge=1)
@@ -42,6 +42,14 @@ class EmbeddedTables(BaseModel):
     detected_tables_detailed_markdown: Optional[List[EmbeddedTable]]
 
 
+class EmbeddedImagesAndTables(BaseModel):
+    """
+    Used in LLM call structured output for combined image and table analysis.
+    """
+    detected_graphs_or_photos: Optional[List[EmbeddedImage]]
+    detected_tables_detailed_markdown: Optional[List[EmbeddedTable]]
+
+
 
 ###############################################################################
 # Document data models - used to store information about the processed document
@@ -97,6 +105,20 @@ class ExtractedTable(BaseModel):
     summary: Optional[str] = None  # Optional GPT-generated summary of the table
 
 
+class PageTriage(BaseModel):
+    """
+    Local (no LLM) pre-classification of a page, deciding whether the multimodal
+    image and table analysis calls are needed at all.
+    """
+    needs_image_analysis: bool
+    needs_table_analysis: bool
+    reason: str
+    embedded_image_count: int = 0
+    vector_drawing_count: int = 0
+    detected_table_count: int = 0
+    skipped_llm_calls: int = 0  # Multimodal calls saved on this page by the triage
+
+
 class PageContent(BaseModel):
     """
     Aggregated content for a single page.
@@ -108,6 +130,8 @@ class PageContent(BaseModel):
     tables: List[ExtractedTable]
     page_text: Optional[DataUnit] = None  # Final combined content for the page
     page_image_cloud_storage_path: Optional[str] = None  # Path to the image file in cloud storage
+    token_usage: Optional[TokenUsage] = None  # Tokens spent on LLM calls for this page
+    triage: Optional[PageTriage] = None  # Local triage decision, if page triage is enabled
 
 
 
@@ -127,6 +151,7 @@ class DocumentContent(BaseModel):
     pages: List[PageContent]  # List of processed page content
     full_text: Optional[str] = None  # Combined text from all pages
     post_processing_content: Optional[PostProcessingContent] = None
+    token_usage: Optional[TokenUsage] = None  # Tokens spent on LLM calls for the whole document
 
 
 
@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+from typing import Any, Awaitable, Callable, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from mm_doc_proc.utils.sqlite_lru_store import SQLiteLRUStore
+from mm_doc_proc.utils.telemetry import llm_stage, record_cache_hit
+
+
+class LLMResultCache:
+    """
+    Persistent, content-addressed cache for the per-page LLM results of the ingestion pipeline.
+
+    Entries are keyed by a hash of the page content (rendered image bytes or raw text),
+    the prompt contents and the model identity, so that re-ingesting an unchanged document
+    (even into another output directory) makes no LLM calls. The cache is stored in a SQLite
+    file and is bounded in size, evicting the least recently used entries first.
+    """
+
+    def __init__(self, cache_directory: Union[str, os.PathLike], max_size_mb: int = 1024):
+        self._store = SQLiteLRUStore(cache_directory, "llm_result_cache.sqlite", max_size_mb=max_size_mb)
+        self.cache_path = self._store.path
+
+    @staticmethod
+    def model_identity(model_info) -> str:
+        """
+        Identify the model that produced a result: provider, model family, deployment and reasoning effort.
+        """
+        if model_info is None:
+            return "default"
+        return "|".join(str(getattr(model_info, field, "")) for field in ("provider", "model_name", "model", "reasoning_efforts"))
+
+    @staticmethod
+    def make_key(kind: str, content: Union[str, bytes], prompt: str, model_info=None) -> str:
+        """
+        Build the cache key from the kind of call, the page content, the prompt and the model identity.
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        digest = hashlib.sha256()
+        for part in (kind.encode("utf-8"), hashlib.sha256(content).digest(), prompt.encode("utf-8"),
+                     LLMResultCache.model_identity(model_info).encode("utf-8")):
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str, response_format: Optional[Type[BaseModel]] = None) -> Any:
+        """
+        Return the cached result for key, or None. Structured outputs are rebuilt as response_format.
+        """
+        serialized = self._store.get(key)
+        if serialized is None:
+            return None
+        if response_format is not None:
+            return response_format.model_validate_json(serialized)
+        return json.loads(serialized)
+
+    def put(self, key: str, value: Any):
+        """
+        Store a result (a string or a Pydantic structured output) and evict old entries if over budget.
+        """
+        if isinstance(value, BaseModel):
+            serialized = value.model_dump_json()
+        else:
+            serialized = json.dumps(value)
+        self._store.put(key, serialized)
+
+    def get_or_call(
+        self,
+        kind: str,
+        content: Union[str, bytes],
+        prompt: str,
+        model_info,
+        call: Callable[[], Any],
+        response_format: Optional[Type[BaseModel]] = None
+    ) -> Any:
+        """
+        Return the cached result for this content/prompt/model, or make the LLM call and cache its result.
+        """
+        key = self.make_key(kind, content, prompt, model_info)
+        result = self.get(key, response_format=response_format)
+        if result is not None:
+            record_cache_hit(getattr(model_info, "model", ""))
+            return result
+
+        result = call()
+        if result is not None:
+            self.put(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+    def close(self):
+        self._store.close()
+
+
+def cached_llm_call(
+    cache: Optional[LLMResultCache],
+    kind: str,
+    content: Union[str, bytes],
+    prompt: str,
+    model_info,
+    call: Callable[[], Any],
+    response_format: Optional[Type[BaseModel]] = None
+) -> Any:
+    """
+    Route an LLM call through the cache if one is given, otherwise just make the call.
+    The call is labelled with kind as its stage in the telemetry.
+    """
+    with llm_stage(kind):
+        if cache is None:
+            return call()
+        return cache.get_or_call(kind, content, prompt, model_info, call, response_format=response_format)
+
+
+async def cached_llm_call_async(
+    cache: Optional[LLMResultCache],
+    kind: str,
+    content: Union[str, bytes],
+    prompt: str,
+    model_info,
+    call: Callable[[], Awaitable[Any]],
+    response_format: Optional[Type[BaseModel]] = None
+) -> Any:
+    """
+    Async counterpart of cached_llm_call: call is a coroutine factory that is only awaited on a cache miss.
+    """
+    with llm_stage(kind):
+        if cache is None:
+            return await call()
+
+        key = cache.make_key(kind, content, prompt, model_info)
+        result = cache.get(key, response_format=response_format)
+        if result is not None:
+            record_cache_hit(getattr(model_info, "model", ""))
+            return result
+
+        result = await call()
+        if result is not None:
+            cache.put(key, result)
+        return result
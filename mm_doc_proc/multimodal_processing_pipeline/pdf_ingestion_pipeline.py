@@ -1,22 +1,33 @@
 import os
 import fitz
+import asyncio
 import re
-from typing import Union, List
+import json
+import hashlib
+from typing import Any, Union, List, Dict, Iterator, Tuple
+from types import SimpleNamespace
 import shutil
 from collections import defaultdict
 from pathlib import Path
 import uuid
+import threading
+from contextlib import contextmanager
+from multiprocessing.dummy import Pool as ThreadPool
 
 # from mm_doc_proc.utils.openai_data_models.openai_data_models import MultimodalProcessingModelInfo
 
 from mm_doc_proc.utils.openai_data_models import (
     MulitmodalProcessingModelInfo, 
     TextProcessingModelnfo,
+    TokenUsage,
+    instantiate_model,
+    instantiate_async_model,
 )
 
 from mm_doc_proc.multimodal_processing_pipeline.data_models import (
     EmbeddedImages,
     EmbeddedTables,
+    EmbeddedImagesAndTables,
     EmbeddedImage,
     EmbeddedTable,
     DataUnit,
@@ -25,17 +36,38 @@ from mm_doc_proc.multimodal_processing_pipeline.data_models import (
     ExtractedImage,
     ExtractedTable,
     PageContent,
+    PageTriage,
     PostProcessingContent,
     DocumentContent
 )
 from mm_doc_proc.multimodal_processing_pipeline.configuration_models import *
+from mm_doc_proc.multimodal_processing_pipeline.llm_result_cache import LLMResultCache
+from mm_doc_proc.utils.prompt_registry import prompt_registry
+from mm_doc_proc.utils.telemetry import TelemetryRun, telemetry_run, llm_stage, record_llm_call, record_cache_hit
+from mm_doc_proc.multimodal_processing_pipeline.batch_backend import (
+    BatchBackend,
+    OpenAIBatchBackend,
+    LocalBatchBackend,
+    batch_endpoint,
+    batch_result_body,
+    write_batch_requests
+)
 from mm_doc_proc.utils.file_utils import *
 from mm_doc_proc.multimodal_processing_pipeline.pipeline_utils import (
     analyze_images,
     analyze_tables,
+    analyze_images_and_tables,
+    triage_page,
     process_text,
     condense_text,
-    generate_table_of_contents
+    generate_table_of_contents,
+    analyze_images_async,
+    analyze_tables_async,
+    analyze_images_and_tables_async,
+    process_text_async,
+    condense_text_async,
+    generate_table_of_contents_async,
+    prepare_llm_request
 )
 from mm_doc_proc.utils.text_utils import *
 from mm_doc_proc.utils.file_utils import *
@@ -62,6 +94,12 @@ class PDFIngestionPipeline:
             else Path("processed") / self.pdf_path.stem
         )
         self.metadata = None
+        # PyMuPDF is not thread-safe, so all fitz access is serialized when pages run in parallel
+        self._fitz_lock = threading.Lock()
+        # Document handle shared by all pages (and workers) during a process_pdf run
+        self._pdf_document = None
+        # Telemetry of the LLM calls of the current run, saved as llm_telemetry.json
+        self.telemetry_run = TelemetryRun()
 
         self._validate_paths()
         self._prepare_directories()
@@ -79,6 +117,17 @@ class PDFIngestionPipeline:
         )
 
         self.processing_pipeline_config = processing_pipeline_config
+        # Used to make sure page checkpoints were produced with the same models, prompts and page settings
+        self._checkpoint_fingerprint = self._page_config_fingerprint()
+
+        self.llm_cache = (
+            LLMResultCache(
+                processing_pipeline_config.llm_cache_directory,
+                max_size_mb=processing_pipeline_config.llm_cache_max_size_mb
+            )
+            if processing_pipeline_config.llm_cache_directory
+            else None
+        )
 
     def _validate_paths(self):
         """Ensure the provided PDF path is valid."""
@@ -107,6 +156,9 @@ class PDFIngestionPipeline:
         copied_file_path = copy_file(self.pdf_path, self.output_directory)
         console.print(f"[bold blue]Copying PDF to new directory:[/bold blue] {copied_file_path}")
 
+        # Used to make sure page checkpoints belong to this exact PDF when resuming
+        self._pdf_md5 = get_file_md5(self.pdf_path)
+
         self.metadata = PDFMetadata(
             document_id=document_id,
             document_path=convert_path(str(self.pdf_path)),
@@ -115,43 +167,65 @@ class PDFIngestionPipeline:
             output_directory=convert_path(str(self.output_directory))
         )
 
-    def _save_page_as_image(self, page, page_number: int) -> str:
+    @contextmanager
+    def _open_pdf_document(self):
         """
-        Render the given PDF page as an image (PNG) and save it under:
-            pages/page_{page_number}/page_{page_number}.png
-        Returns the path to the saved image.
+        Open the PDF once for the duration of an ingestion run, so that pages
+        don't each re-open and re-parse the whole file.
         """
-        page_dir = self.output_directory / "pages" / f"page_{page_number}"
-        page_dir.mkdir(parents=True, exist_ok=True)
-
-        page_image_path = page_dir / f"page_{page_number}.png"
-        pix = page.get_pixmap(dpi=300)
-        pix.save(page_image_path)
-        return str(page_image_path)
-
-    def _save_page_as_image_jpg(self, page, page_number: int) -> str:
+        self._pdf_document = fitz.open(self.pdf_path)
+        try:
+            yield self._pdf_document
+        finally:
+            with self._fitz_lock:
+                self._pdf_document.close()
+                self._pdf_document = None
+
+    def _render_page_image(self, page, page_number: int):
         """
-        Render the given PDF page as a high-quality JPEG and save it under:
-            pages/page_{page_number}/page_{page_number}.jpg
-        Returns the path to the saved image.
+        Render the given PDF page once, in memory, as JPEG bytes for the multimodal model.
+        The page image is only written to disk if save_page_images is on, under:
+            pages/page_{page_number}/page_{page_number}.jpg (or .png if process_pages_as_jpg is off)
+        Returns the path to the saved image ("" if not saved) and the JPEG bytes.
         """
+        config = self.processing_pipeline_config
+        pix = page.get_pixmap(dpi=config.page_image_dpi)
+        page_image_bytes = pix.tobytes(output="jpeg", jpg_quality=config.page_image_jpg_quality)
+
+        if not config.save_page_images:
+            return "", page_image_bytes
+
         page_dir = self.output_directory / "pages" / f"page_{page_number}"
         page_dir.mkdir(parents=True, exist_ok=True)
 
-        page_image_path = page_dir / f"page_{page_number}.jpg"
-        pix = page.get_pixmap(dpi=300)
-        pix.save(page_image_path, output="jpg", jpg_quality=80)
-        return str(page_image_path)
+        if config.process_pages_as_jpg:
+            page_image_path = page_dir / f"page_{page_number}.jpg"
+            page_image_path.write_bytes(page_image_bytes)
+        else:
+            page_image_path = page_dir / f"page_{page_number}.png"
+            pix.save(page_image_path)
 
-    def _extract_text_from_page(self, page, page_number: int, page_image_path: str) -> ExtractedText:
+        return str(page_image_path), page_image_bytes
+
+    def _extract_text_from_page(
+        self,
+        text: str,
+        page_number: int,
+        page_image_path: str,
+        usage: Optional[TokenUsage] = None,
+        processed_text: Optional[str] = None
+    ) -> ExtractedText:
         """
-        Extract raw text from a PDF page, process it using GPT (if configured),
+        Take the raw text of a PDF page, process it using GPT (if configured),
         and save to: pages/page_{page_number}/page_{page_number}.txt
+        If processed_text is given (e.g. from an async call), no LLM call is made.
         """
         processed_or_raw_text = False
-        text = page.get_text()
-        if self.processing_pipeline_config.process_text:
-            text = process_text(text, model_info=self._text_model)
+        if processed_text is not None:
+            text = processed_text
+            processed_or_raw_text = True
+        elif self.processing_pipeline_config.process_text:
+            text = process_text(text, model_info=self._text_model, usage=usage, cache=self.llm_cache)
             processed_or_raw_text = True
         console.print("[bold magenta]Extracted/Processed Text:[/bold magenta]", text)
 
@@ -172,14 +246,25 @@ class PDFIngestionPipeline:
         )
         return extracted_text
 
-    def _extract_images_from_page(self, page_image_path: str, page_number: int) -> List[ExtractedImage]:
+    def _extract_images_from_page(
+        self,
+        page_image_path: str,
+        page_number: int,
+        page_image_bytes: Optional[bytes] = None,
+        usage: Optional[TokenUsage] = None,
+        image_results: Optional[EmbeddedImages] = None
+    ) -> List[ExtractedImage]:
         """
         Use an LLM-based function to detect/describe embedded images.
+        If image_results is given (e.g. from a combined analysis call), no LLM call is made.
         Save each description in:
             pages/page_{page_number}/images/page_{page_number}_image_{i+1}.txt
         """
         images = []
-        image_results = analyze_images(page_image_path, model_info=self._mm_model)
+        if image_results is None:
+            image_results = analyze_images(
+                page_image_path, model_info=self._mm_model, usage=usage, cache=self.llm_cache, image_bytes=page_image_bytes
+            )
 
         if image_results.detected_graphs_or_photos:
             # ensure subfolder: pages/page_{page_number}/images
@@ -211,14 +296,25 @@ class PDFIngestionPipeline:
         console.print("[bold cyan]Extracted Images:[/bold cyan]", images)
         return images
 
-    def _extract_tables_from_page(self, page_image_path: str, page_number: int) -> List[ExtractedTable]:
+    def _extract_tables_from_page(
+        self,
+        page_image_path: str,
+        page_number: int,
+        page_image_bytes: Optional[bytes] = None,
+        usage: Optional[TokenUsage] = None,
+        table_results: Optional[EmbeddedTables] = None
+    ) -> List[ExtractedTable]:
         """
         Use an LLM-based function to detect/describe embedded tables.
+        If table_results is given (e.g. from a combined analysis call), no LLM call is made.
         Save each table's description in:
             pages/page_{page_number}/tables/page_{page_number}_table_{i+1}.txt
         """
         tables = []
-        table_results = analyze_tables(page_image_path, model_info=self._mm_model)
+        if table_results is None:
+            table_results = analyze_tables(
+                page_image_path, model_info=self._mm_model, usage=usage, cache=self.llm_cache, image_bytes=page_image_bytes
+            )
 
         if table_results.detected_tables_detailed_markdown:
             tables_dir = self.output_directory / "pages" / f"page_{page_number}" / "tables"
@@ -248,6 +344,31 @@ class PDFIngestionPipeline:
         console.print("[bold green]Extracted Tables:[/bold green]", tables)
         return tables
 
+    def _extract_images_and_tables_from_page(
+        self,
+        page_image_path: str,
+        page_number: int,
+        page_image_bytes: Optional[bytes] = None,
+        usage: Optional[TokenUsage] = None
+    ):
+        """
+        Detect/describe embedded images and tables with a single multimodal LLM call,
+        then save them exactly as _extract_images_from_page and _extract_tables_from_page would.
+        """
+        results = analyze_images_and_tables(
+            page_image_path, model_info=self._mm_model, usage=usage, cache=self.llm_cache, image_bytes=page_image_bytes
+        )
+
+        images = self._extract_images_from_page(
+            page_image_path, page_number,
+            image_results=EmbeddedImages(detected_graphs_or_photos=results.detected_graphs_or_photos)
+        )
+        tables = self._extract_tables_from_page(
+            page_image_path, page_number,
+            table_results=EmbeddedTables(detected_tables_detailed_markdown=results.detected_tables_detailed_markdown)
+        )
+        return images, tables
+
     def _combine_page_content(
         self,
         page_number: int,
@@ -281,46 +402,80 @@ class PDFIngestionPipeline:
                 if table.summary:
                     combined += f"Summary:\n{table.summary}\n\n"
 
-        combined += (
-            f'<br/>\n<br/>\n<img src="{page_image_path}" '
-            f'alt="Page Number {page_number}" width="300" height="425">'
-        )
+        if page_image_path:
+            combined += (
+                f'<br/>\n<br/>\n<img src="{page_image_path}" '
+                f'alt="Page Number {page_number}" width="300" height="425">'
+            )
         combined += "\n\n\n\n"
         return combined
 
-    def _process_page(self, page_number: int) -> PageContent:
+    def _render_page(self, pdf_document, page_number: int):
         """
-        Orchestrates the workflow for a single PDF page: 
-        - Convert page to image
-        - Extract text
-        - Extract images
-        - Extract tables
-        - Combine final text
+        Render the page image in memory (saving it if configured), read the raw page text
+        and, if enabled, triage the page locally.
+        Returns the image path, the JPEG bytes, the raw text and the triage (or None).
         """
-        with fitz.open(self.pdf_path) as pdf_document:
-            page = pdf_document[page_number - 1]
-
-            # 1) Save the page as an image (png or jpg)
-            if self.processing_pipeline_config.process_pages_as_jpg:
-                page_image_path = self._save_page_as_image_jpg(page, page_number)
-            else:
-                page_image_path = self._save_page_as_image(page, page_number)
-
-            # 2) Extract and process text
-            extracted_text = self._extract_text_from_page(page, page_number, page_image_path)
+        config = self.processing_pipeline_config
+        page = pdf_document[page_number - 1]
+        page_image_path, page_image_bytes = self._render_page_image(page, page_number)
+
+        triage = None
+        if config.triage_pages and (config.process_images or config.process_tables):
+            triage = triage_page(
+                page,
+                min_vector_drawings=config.triage_min_vector_drawings,
+                min_image_area_ratio=config.triage_min_image_area_ratio
+            )
 
-            images = []
-            tables = []
+        return page_image_path, page_image_bytes, page.get_text(), triage
 
-            # 3) Extract images
-            if self.processing_pipeline_config.process_images:
-                images = self._extract_images_from_page(page_image_path, page_number)
+    def _multimodal_call_count(self, run_images: bool, run_tables: bool) -> int:
+        if self.processing_pipeline_config.combine_image_and_table_analysis and run_images and run_tables:
+            return 1
+        return int(run_images) + int(run_tables)
 
-            # 4) Extract tables
-            if self.processing_pipeline_config.process_tables:
-                tables = self._extract_tables_from_page(page_image_path, page_number)
+    def _render_page_locked(self, page_number: int):
+        """
+        Render and triage a page under the PyMuPDF lock, using the shared document handle if one is open.
+        """
+        with self._fitz_lock:
+            if self._pdf_document is not None:
+                return self._render_page(self._pdf_document, page_number)
+            # Called outside of an ingestion run, fall back to a short-lived handle
+            with fitz.open(self.pdf_path) as pdf_document:
+                return self._render_page(pdf_document, page_number)
+
+    def _plan_multimodal_calls(self, page_number: int, triage: Optional[PageTriage]):
+        """
+        Decide which multimodal analyses to run for a page, given its triage (if any).
+        Returns (run_images, run_tables).
+        """
+        config = self.processing_pipeline_config
+        run_images = config.process_images and (triage is None or triage.needs_image_analysis)
+        run_tables = config.process_tables and (triage is None or triage.needs_table_analysis)
+        if triage is not None:
+            triage.skipped_llm_calls = (
+                self._multimodal_call_count(config.process_images, config.process_tables)
+                - self._multimodal_call_count(run_images, run_tables)
+            )
+            console.print(f"[bold yellow]Page {page_number} triage:[/bold yellow] {triage.reason} "
+                          f"-> images: {run_images}, tables: {run_tables}")
+        return run_images, run_tables
 
-        # 5) Combine results in a single text block
+    def _build_page_content(
+        self,
+        page_number: int,
+        extracted_text: ExtractedText,
+        page_image_path: str,
+        images: List[ExtractedImage],
+        tables: List[ExtractedTable],
+        usage: TokenUsage,
+        triage: Optional[PageTriage]
+    ) -> PageContent:
+        """
+        Combine the page results, save them as page_{page_number}_twin.txt and build the PageContent.
+        """
         combined_str = self._combine_page_content(
             page_number, extracted_text, page_image_path, images, tables
         )
@@ -342,21 +497,495 @@ class PDFIngestionPipeline:
                 text=combined_str,
                 text_file_path=convert_path(str(page_text_filename)),
                 page_image_path=convert_path(page_image_path)
+            ),
+            token_usage=usage,
+            triage=triage
+        )
+        return page_content
+
+    def _process_page(self, page_number: int) -> PageContent:
+        """
+        Orchestrates the workflow for a single PDF page: 
+        - Convert page to image
+        - Extract text
+        - Extract images
+        - Extract tables
+        - Combine final text
+        """
+        # 1) Render the page as an image (png or jpg), read its raw text and triage it
+        page_image_path, page_image_bytes, raw_text, triage = self._render_page_locked(page_number)
+
+        usage = TokenUsage()
+
+        # 2) Extract and process text
+        extracted_text = self._extract_text_from_page(raw_text, page_number, page_image_path, usage=usage)
+
+        images = []
+        tables = []
+        run_images, run_tables = self._plan_multimodal_calls(page_number, triage)
+
+        if self.processing_pipeline_config.combine_image_and_table_analysis and run_images and run_tables:
+            # 3+4) Extract images and tables with a single multimodal call
+            images, tables = self._extract_images_and_tables_from_page(
+                page_image_path, page_number, page_image_bytes, usage=usage
+            )
+        else:
+            # 3) Extract images
+            if run_images:
+                images = self._extract_images_from_page(page_image_path, page_number, page_image_bytes, usage=usage)
+
+            # 4) Extract tables
+            if run_tables:
+                tables = self._extract_tables_from_page(page_image_path, page_number, page_image_bytes, usage=usage)
+
+        # 5) Combine results in a single text block
+        return self._build_page_content(page_number, extracted_text, page_image_path, images, tables, usage, triage)
+
+    async def _process_page_async(self, page_number: int) -> PageContent:
+        """
+        Async version of _process_page. Rendering runs in a worker thread, and the text and
+        image/table LLM calls of the page are awaited concurrently instead of one after another.
+        """
+        page_image_path, page_image_bytes, raw_text, triage = await asyncio.to_thread(self._render_page_locked, page_number)
+
+        usage = TokenUsage()
+        config = self.processing_pipeline_config
+        run_images, run_tables = self._plan_multimodal_calls(page_number, triage)
+        combined = config.combine_image_and_table_analysis and run_images and run_tables
+
+        calls = {}
+        if config.process_text:
+            calls["process_text"] = process_text_async(raw_text, model_info=self._text_model, usage=usage, cache=self.llm_cache)
+        if combined:
+            calls["analyze_images_and_tables"] = analyze_images_and_tables_async(
+                page_image_path, model_info=self._mm_model, usage=usage, cache=self.llm_cache, image_bytes=page_image_bytes
             )
+        else:
+            if run_images:
+                calls["analyze_images"] = analyze_images_async(
+                    page_image_path, model_info=self._mm_model, usage=usage, cache=self.llm_cache, image_bytes=page_image_bytes
+                )
+            if run_tables:
+                calls["analyze_tables"] = analyze_tables_async(
+                    page_image_path, model_info=self._mm_model, usage=usage, cache=self.llm_cache, image_bytes=page_image_bytes
+                )
+
+        results = dict(zip(calls.keys(), await asyncio.gather(*calls.values())))
+
+        return self._page_content_from_results(page_number, page_image_path, raw_text, results, usage, triage)
+
+    def _page_content_from_results(
+        self,
+        page_number: int,
+        page_image_path: str,
+        raw_text: str,
+        results: Dict[str, Any],
+        usage: TokenUsage,
+        triage: Optional[PageTriage]
+    ) -> PageContent:
+        """
+        Save and assemble a page from LLM results obtained elsewhere (async or batch calls),
+        keyed by kind of call: process_text, analyze_images, analyze_tables, analyze_images_and_tables.
+        """
+        if "analyze_images_and_tables" in results:
+            combined_results = results["analyze_images_and_tables"]
+            results["analyze_images"] = EmbeddedImages(detected_graphs_or_photos=combined_results.detected_graphs_or_photos)
+            results["analyze_tables"] = EmbeddedTables(detected_tables_detailed_markdown=combined_results.detected_tables_detailed_markdown)
+
+        extracted_text = self._extract_text_from_page(
+            raw_text, page_number, page_image_path, processed_text=results.get("process_text")
         )
+        images = []
+        tables = []
+        if "analyze_images" in results:
+            images = self._extract_images_from_page(page_image_path, page_number, image_results=results["analyze_images"])
+        if "analyze_tables" in results:
+            tables = self._extract_tables_from_page(page_image_path, page_number, table_results=results["analyze_tables"])
+
+        return self._build_page_content(page_number, extracted_text, page_image_path, images, tables, usage, triage)
+
+    def _instantiate_models(self):
+        """
+        Create the LLM clients up front, so that parallel page workers share them
+        instead of each racing to instantiate its own, and so that the model identity
+        used in LLM cache keys is resolved before the first lookup.
+        """
+        config = self.processing_pipeline_config
+        uses_text_model = config.process_text or config.generate_condensed_text or config.generate_table_of_contents
+        if uses_text_model and self._text_model.client is None:
+            instantiate_model(self._text_model)
+        if (config.process_images or config.process_tables) and self._mm_model.client is None:
+            instantiate_model(self._mm_model)
+
+    def _instantiate_async_models(self):
+        """
+        Async counterpart of _instantiate_models: one AsyncAzureOpenAI / AsyncOpenAI client
+        per model, shared by all the coroutines of a process_pdf_async run.
+        """
+        config = self.processing_pipeline_config
+        uses_text_model = config.process_text or config.generate_condensed_text or config.generate_table_of_contents
+        if uses_text_model and self._text_model.async_client is None:
+            instantiate_async_model(self._text_model)
+        if (config.process_images or config.process_tables) and self._mm_model.async_client is None:
+            instantiate_async_model(self._mm_model)
+
+    def _page_config_fingerprint(self) -> str:
+        """
+        Hash of everything that shapes a page's content: the models, the prompts and the page processing settings.
+        """
+        config = self.processing_pipeline_config
+        page_config = config.model_dump(include={
+            "process_pages_as_jpg", "page_image_dpi", "page_image_jpg_quality",
+            "process_text", "process_images", "process_tables", "combine_image_and_table_analysis",
+            "triage_pages", "triage_min_vector_drawings", "triage_min_image_area_ratio"
+        })
+        page_config["text_model"] = LLMResultCache.model_identity(self._text_model)
+        page_config["multimodal_model"] = LLMResultCache.model_identity(self._mm_model)
+        page_config["prompts"] = prompt_registry.fingerprint()
+        return hashlib.sha256(json.dumps(page_config, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _page_checkpoint_path(self, page_number: int) -> Path:
+        return self.output_directory / "pages" / f"page_{page_number}" / "page_content.json"
+
+    def _save_page_checkpoint(self, page_content: PageContent):
+        """
+        Save a finished page as pages/page_{page_number}/page_content.json, so that
+        an interrupted run can be resumed without redoing it. The file is written
+        atomically, so a crash never leaves a half-written checkpoint behind.
+        """
+        checkpoint_path = self._page_checkpoint_path(page_content.page_number)
+        tmp_path = checkpoint_path.with_suffix(".json.tmp")
+        write_json_file({
+            "pdf_md5": self._pdf_md5,
+            "config_fingerprint": self._checkpoint_fingerprint,
+            "page_content": page_content.model_dump()
+        }, tmp_path)
+        os.replace(tmp_path, checkpoint_path)
+
+    def _load_page_checkpoints(self) -> Dict[int, PageContent]:
+        """
+        Load the pages completed by a previous run of the same PDF into this output directory.
+        Checkpoints written with other models, prompts or page settings are ignored, so those pages are redone.
+        """
+        completed_pages = {}
+        for page_number in range(1, self.metadata.total_pages + 1):
+            checkpoint_path = self._page_checkpoint_path(page_number)
+            if not checkpoint_path.is_file():
+                continue
+            try:
+                checkpoint = read_json_file(checkpoint_path)
+                if checkpoint.get("pdf_md5") != self._pdf_md5:
+                    continue
+                if checkpoint.get("config_fingerprint") != self._checkpoint_fingerprint:
+                    continue
+                completed_pages[page_number] = PageContent(**checkpoint["page_content"])
+            except Exception as e:
+                console.print(f"[bold yellow]Ignoring unreadable checkpoint {checkpoint_path}:[/bold yellow] {e}")
+        return completed_pages
+
+    def _process_page_with_progress(self, page_number: int) -> PageContent:
+        console.print(f"Processing page {page_number}/{self.metadata.total_pages}...")
+        # Set here rather than in iter_pages, since pool worker threads do not inherit context variables
+        with telemetry_run(self.telemetry_run):
+            page_content = self._process_page(page_number)
+        self._save_page_checkpoint(page_content)
         return page_content
 
+    def _pages_to_process(self):
+        """
+        Returns the pages checkpointed by a previous run (if resume is set) and the page numbers still to process.
+        """
+        completed_pages = self._load_page_checkpoints() if self.processing_pipeline_config.resume else {}
+        if completed_pages:
+            console.print(f"Resuming: {len(completed_pages)}/{self.metadata.total_pages} pages already processed.")
+
+        page_numbers = [n for n in range(1, self.metadata.total_pages + 1) if n not in completed_pages]
+        return completed_pages, page_numbers
+
+    def iter_pages(self) -> Iterator[PageContent]:
+        """
+        Process the PDF and yield each PageContent as soon as it is finished, so that callers
+        can show progress or start downstream work on early pages. With max_concurrent_pages > 1,
+        pages are yielded in completion order (each carries its page_number).
+
+        Once the iterator is exhausted, the document is finalized exactly like process_pdf does
+        (text twin, optional post-processing, JSON) and is available as self.document.
+
+        Every finished page is checkpointed under pages/page_{n}/. If resume is set,
+        pages checkpointed by a previous run are yielded first instead of being processed again.
+        """
+        completed_pages, page_numbers = self._pages_to_process()
+        max_concurrent_pages = self.processing_pipeline_config.max_concurrent_pages
+        self.telemetry_run = TelemetryRun()
+
+        if self.llm_cache is not None:
+            self._instantiate_models()
+
+        pages = []
+        for page_content in sorted(completed_pages.values(), key=lambda p: p.page_number):
+            pages.append(page_content)
+            yield page_content
+
+        with self._open_pdf_document():
+            if max_concurrent_pages > 1 and len(page_numbers) > 1:
+                console.print(f"Processing {len(page_numbers)} pages with {max_concurrent_pages} concurrent workers...")
+                self._instantiate_models()
+                with ThreadPool(min(max_concurrent_pages, len(page_numbers))) as pool:
+                    for page_content in pool.imap_unordered(self._process_page_with_progress, page_numbers):
+                        pages.append(page_content)
+                        yield page_content
+            else:
+                for page_number in page_numbers:
+                    page_content = self._process_page_with_progress(page_number)
+                    pages.append(page_content)
+                    yield page_content
+
+        self._finalize_document(pages)
+
     def process_pdf(self) -> DocumentContent:
         """
         Process the entire PDF, page by page. Optionally performs post-processing steps
         (e.g. text twin, condensed text, table of contents) and saves them in the output root.
+
+        If max_concurrent_pages > 1, pages are processed in parallel by a thread pool
+        and put back in page order before the full text is assembled.
+        See iter_pages for page checkpoints and resuming.
+        If batch_mode is set, the LLM calls are run as offline batch jobs instead (see process_pdf_batch).
         """
-        pages = []
-        for page_number in range(1, self.metadata.total_pages + 1):
-            console.print(f"Processing page {page_number}/{self.metadata.total_pages}...")
-            page_content = self._process_page(page_number)
+        if self.processing_pipeline_config.batch_mode:
+            return self.process_pdf_batch()
+
+        for _ in self.iter_pages():
+            pass
+
+        return self.document
+
+    async def process_pdf_async(self) -> DocumentContent:
+        """
+        Async version of process_pdf, for callers that already run an event loop (e.g. FastAPI).
+
+        All LLM calls go through AsyncAzureOpenAI / AsyncOpenAI clients, so pages are processed
+        concurrently without a thread per in-flight request; max_concurrent_pages bounds how many
+        pages are in flight at once. Within a page, the text and image/table calls are also
+        awaited concurrently, as are the condensed text and table of contents at the end.
+        Pages are checkpointed and resumed exactly like process_pdf.
+        """
+        completed_pages, page_numbers = self._pages_to_process()
+        semaphore = asyncio.Semaphore(self.processing_pipeline_config.max_concurrent_pages)
+        self._instantiate_async_models()
+        self.telemetry_run = TelemetryRun()
+
+        async def process_page(page_number: int) -> PageContent:
+            async with semaphore:
+                console.print(f"Processing page {page_number}/{self.metadata.total_pages}...")
+                with telemetry_run(self.telemetry_run):
+                    page_content = await self._process_page_async(page_number)
+                self._save_page_checkpoint(page_content)
+                return page_content
+
+        pages = list(completed_pages.values())
+        with self._open_pdf_document():
+            pages.extend(await asyncio.gather(*(process_page(n) for n in page_numbers)))
+
+        document = self._assemble_document(pages)
+
+        if self.processing_pipeline_config.save_text_files:
+            self.save_text_twin(document)
+
+        post_processing = []
+        if self.processing_pipeline_config.generate_condensed_text:
+            post_processing.append(self.condense_text_async(document))
+        if self.processing_pipeline_config.generate_table_of_contents:
+            post_processing.append(self.generate_table_of_contents_async(document))
+        with telemetry_run(self.telemetry_run):
+            await asyncio.gather(*post_processing)
+
+        return self._complete_document(document)
+
+    ###########################################################################
+    # Batch mode
+    ###########################################################################
+
+    def _page_llm_calls(self, raw_text: str, page_image_bytes: bytes, run_images: bool, run_tables: bool):
+        """
+        The LLM calls _process_page would make for a page, as (kind, content, model_info).
+        """
+        config = self.processing_pipeline_config
+        calls = []
+        if config.process_text:
+            calls.append(("process_text", raw_text, self._text_model))
+        if config.combine_image_and_table_analysis and run_images and run_tables:
+            calls.append(("analyze_images_and_tables", page_image_bytes, self._mm_model))
+        else:
+            if run_images:
+                calls.append(("analyze_images", page_image_bytes, self._mm_model))
+            if run_tables:
+                calls.append(("analyze_tables", page_image_bytes, self._mm_model))
+        return calls
+
+    def _batch_backend(self, model_info) -> BatchBackend:
+        config = self.processing_pipeline_config
+        if config.batch_backend == "local":
+            return LocalBatchBackend(self.output_directory / "batch", client=model_info.client)
+        return OpenAIBatchBackend(model_info.client, completion_window=config.batch_completion_window)
+
+    def _run_llm_calls_as_batch(self, calls: Dict[str, Tuple[str, Any, Any]], batch_name: str):
+        """
+        Run {custom_id: (kind, content, model_info)} as offline batch jobs, one per model and input file part
+        (see write_batch_requests).
+        Results already in the LLM cache are not sent, and new results are added to it.
+
+        Returns the parsed results and the token usage of each call, by custom_id.
+        Calls that failed in the batch are missing from the results.
+        """
+        results = {}
+        usages = {}
+        batches = {}
+        pending = {}
+        for custom_id, (kind, content, model_info) in calls.items():
+            prompt_template, body, response_format = prepare_llm_request(kind, content, model_info)
+            cache_key = None
+            if self.llm_cache is not None:
+                cache_key = self.llm_cache.make_key(kind, content, prompt_template, model_info)
+                cached_result = self.llm_cache.get(cache_key, response_format=response_format)
+                if cached_result is not None:
+                    with telemetry_run(self.telemetry_run), llm_stage(kind):
+                        record_cache_hit(model_info.model)
+                    results[custom_id] = cached_result
+                    continue
+            batches.setdefault(id(model_info), (model_info, {}))[1][custom_id] = body
+            pending[custom_id] = (kind, cache_key, response_format)
+
+        config = self.processing_pipeline_config
+        for i, (model_info, bodies) in enumerate(batches.values()):
+            # Page images make the lines large, so a big document may need several batch jobs
+            requests_paths = write_batch_requests(
+                bodies, self.output_directory / "batch", f"{batch_name}_{i+1}", batch_endpoint(model_info.client),
+                max_file_bytes=config.batch_max_file_mb * 1024 * 1024,
+                max_requests=config.batch_max_requests_per_file
+            )
+            batch_results = self._batch_backend(model_info).run_many(requests_paths, config.batch_poll_interval)
+
+            for custom_id in bodies:
+                body = batch_result_body(batch_results.get(custom_id))
+                kind, cache_key, response_format = pending[custom_id]
+                with telemetry_run(self.telemetry_run), llm_stage(kind):
+                    record_llm_call(model_info.client, model_info.model, body, outcome="batch" if body is not None else "error")
+                if body is None:
+                    continue
+                content = body["choices"][0]["message"]["content"]
+                result = response_format.model_validate_json(content) if response_format is not None else content
+                results[custom_id] = result
+                usages[custom_id] = body.get("usage")
+                if cache_key is not None:
+                    self.llm_cache.put(cache_key, result)
+
+        return results, usages
+
+    def process_pdf_batch(self) -> DocumentContent:
+        """
+        Process the PDF with all LLM calls sent as offline batch jobs: every page is rendered and triaged,
+        the page requests are written to a JSONL batch file under batch/, submitted, polled until done,
+        and the results are mapped back into PageContent. The condensed text and table of contents
+        are then requested as a second batch. Meant for bulk re-ingestion, where batch pricing and
+        quota matter more than latency.
+
+        Pages whose requests failed in the batch are processed live instead. Page checkpoints,
+        resume and the LLM cache work as in process_pdf.
+        """
+        config = self.processing_pipeline_config
+        completed_pages, page_numbers = self._pages_to_process()
+        self._instantiate_models()
+        self.telemetry_run = TelemetryRun()
+
+        # 1) Render and triage every page, and collect the page LLM calls
+        rendered_pages = {}
+        calls = {}
+        with self._open_pdf_document():
+            for page_number in page_numbers:
+                page_image_path, page_image_bytes, raw_text, triage = self._render_page_locked(page_number)
+                run_images, run_tables = self._plan_multimodal_calls(page_number, triage)
+                page_calls = self._page_llm_calls(raw_text, page_image_bytes, run_images, run_tables)
+                rendered_pages[page_number] = (page_image_path, raw_text, triage, [kind for kind, _, _ in page_calls])
+                for kind, content, model_info in page_calls:
+                    calls[f"page_{page_number}:{kind}"] = (kind, content, model_info)
+
+        # 2) Run them as a batch
+        results, usages = self._run_llm_calls_as_batch(calls, "pages")
+
+        # 3) Map the results back into the pages
+        pages = list(completed_pages.values())
+        for page_number, (page_image_path, raw_text, triage, kinds) in rendered_pages.items():
+            custom_ids = {kind: f"page_{page_number}:{kind}" for kind in kinds}
+            if any(custom_id not in results for custom_id in custom_ids.values()):
+                console.print(f"[bold yellow]Batch requests of page {page_number} failed, processing it live.[/bold yellow]")
+                pages.append(self._process_page_with_progress(page_number))
+                continue
+
+            usage = TokenUsage()
+            for custom_id in custom_ids.values():
+                if custom_id in usages:
+                    usage.add(SimpleNamespace(**(usages[custom_id] or {})))
+            page_results = {kind: results[custom_id] for kind, custom_id in custom_ids.items()}
+            page_content = self._page_content_from_results(page_number, page_image_path, raw_text, page_results, usage, triage)
+            self._save_page_checkpoint(page_content)
             pages.append(page_content)
 
+        document = self._assemble_document(pages)
+
+        if config.save_text_files:
+            self.save_text_twin(document)
+
+        # 4) Post-processing as a second batch
+        post_processing_calls = {}
+        if document.full_text and config.generate_condensed_text:
+            post_processing_calls["condense_text"] = ("condense_text", document.full_text, self._text_model)
+        if document.full_text and config.generate_table_of_contents:
+            post_processing_calls["generate_table_of_contents"] = ("generate_table_of_contents", document.full_text, self._text_model)
+
+        results, usages = self._run_llm_calls_as_batch(post_processing_calls, "post_processing")
+        for usage in usages.values():
+            document.token_usage.add(SimpleNamespace(**(usage or {})))
+
+        with telemetry_run(self.telemetry_run):
+            if "condense_text" in results:
+                self._save_condensed_text(document, results["condense_text"])
+            elif "condense_text" in post_processing_calls:
+                self.condense_text(document)
+
+            if "generate_table_of_contents" in results:
+                self._save_table_of_contents(document, results["generate_table_of_contents"])
+            elif "generate_table_of_contents" in post_processing_calls:
+                self.generate_table_of_contents(document)
+
+        return self._complete_document(document)
+
+    def _finalize_document(self, pages: List[PageContent]) -> DocumentContent:
+        """
+        Put the pages back in page order, assemble the DocumentContent and run the
+        post-processing steps.
+        """
+        document = self._assemble_document(pages)
+
+        # Optional post-processing
+        if self.processing_pipeline_config.save_text_files:
+            self.save_text_twin(document)
+
+        with telemetry_run(self.telemetry_run):
+            if self.processing_pipeline_config.generate_condensed_text:
+                self.condense_text(document)
+
+            if self.processing_pipeline_config.generate_table_of_contents:
+                self.generate_table_of_contents(document)
+
+        return self._complete_document(document)
+
+    def _assemble_document(self, pages: List[PageContent]) -> DocumentContent:
+        """
+        Put the pages back in page order and build the DocumentContent, summing the page token usage.
+        """
+        pages = sorted(pages, key=lambda p: p.page_number)
+
         # Build full_text from all pages
         full_text = "\n".join(
             p.page_text.text for p in pages if p.page_text and p.page_text.text
@@ -364,24 +993,46 @@ class PDFIngestionPipeline:
 
         self.metadata.processed_pages = len(pages)
 
+        token_usage = TokenUsage()
+        for p in pages:
+            if p.token_usage:
+                token_usage.add(p.token_usage)
+
         document = DocumentContent(
             metadata=self.metadata,
             pages=pages,
-            full_text=full_text
+            full_text=full_text,
+            token_usage=token_usage
         )
+        return document
 
-        # Optional post-processing
-        if self.processing_pipeline_config.save_text_files:
-            self.save_text_twin(document)
-
-        if self.processing_pipeline_config.generate_condensed_text:
-            self.condense_text(document)
-
-        if self.processing_pipeline_config.generate_table_of_contents:
-            self.generate_table_of_contents(document)
+    def _complete_document(self, document: DocumentContent) -> DocumentContent:
+        """
+        Report token usage, triage and cache statistics, then save the DocumentContent
+        and the telemetry of the run's LLM calls (llm_telemetry.json) as JSON.
+        """
+        pages = document.pages
+        console.print(
+            f"[bold blue]Token usage:[/bold blue] {document.token_usage.llm_calls} LLM calls, "
+            f"{document.token_usage.prompt_tokens:,} prompt tokens, "
+            f"{document.token_usage.completion_tokens:,} completion tokens"
+        )
+        triaged_pages = [p.triage for p in pages if p.triage is not None]
+        if triaged_pages:
+            console.print(
+                f"[bold blue]Page triage:[/bold blue] {sum(t.skipped_llm_calls for t in triaged_pages)} multimodal "
+                f"LLM calls skipped over {len(triaged_pages)} pages"
+            )
+        if self.llm_cache is not None:
+            cache_stats = self.llm_cache.stats()
+            console.print(
+                f"[bold blue]LLM cache:[/bold blue] {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                f"({cache_stats['entries']} entries, {cache_stats['size_bytes'] / (1024 * 1024):.1f} MB)"
+            )
 
         # Save the entire DocumentContent as JSON in the output root
         self.save_document_content_json(document)
+        self.telemetry_run.dump_json(self.output_directory / "llm_telemetry.json")
 
         self.document = document
 
@@ -417,8 +1068,26 @@ class PDFIngestionPipeline:
         
         if not document_content.full_text:
             return
-        condensed_text_result = condense_text(document_content.full_text, model_info=self._text_model)
+        condensed_text_result = condense_text(
+            document_content.full_text, model_info=self._text_model, usage=document_content.token_usage, cache=self.llm_cache
+        )
+        self._save_condensed_text(document_content, condensed_text_result)
 
+    async def condense_text_async(self, document_content: Optional[DocumentContent] = None):
+        """
+        Async version of condense_text.
+        """
+        if not document_content: # If not provided, use the one stored in the instance
+            document_content = self.document
+
+        if not document_content.full_text:
+            return
+        condensed_text_result = await condense_text_async(
+            document_content.full_text, model_info=self._text_model, usage=document_content.token_usage, cache=self.llm_cache
+        )
+        self._save_condensed_text(document_content, condensed_text_result)
+
+    def _save_condensed_text(self, document_content: DocumentContent, condensed_text_result: str):
         condensed_path = self.output_directory / "condensed_text.md"
         write_to_file(condensed_text_result, condensed_path, mode="w")
 
@@ -441,7 +1110,26 @@ class PDFIngestionPipeline:
 
         if not document_content.full_text:
             return
-        toc_text = generate_table_of_contents(document_content.full_text, model_info=self._text_model)
+        toc_text = generate_table_of_contents(
+            document_content.full_text, model_info=self._text_model, usage=document_content.token_usage, cache=self.llm_cache
+        )
+        self._save_table_of_contents(document_content, toc_text)
+
+    async def generate_table_of_contents_async(self, document_content: Optional[DocumentContent] = None):
+        """
+        Async version of generate_table_of_contents.
+        """
+        if not document_content: # If not provided, use the one stored in the instance
+            document_content = self.document
+
+        if not document_content.full_text:
+            return
+        toc_text = await generate_table_of_contents_async(
+            document_content.full_text, model_info=self._text_model, usage=document_content.token_usage, cache=self.llm_cache
+        )
+        self._save_table_of_contents(document_content, toc_text)
+
+    def _save_table_of_contents(self, document_content: DocumentContent, toc_text: str):
         toc_text = toc_text.replace("```markdown", "").replace("```", "")
 
         toc_text_path = self.output_directory / "table_of_contents.md"
@@ -3,8 +3,11 @@ import base64
 from PIL import Image
 from mm_doc_proc.utils.file_utils import write_to_file, replace_extension, read_asset_file, locate_prompt
 from mm_doc_proc.utils.text_utils import clean_up_text, extract_markdown, extract_code
-from mm_doc_proc.utils.openai_utils import call_llm, call_llm_structured_outputs
-from mm_doc_proc.multimodal_processing_pipeline.data_models import EmbeddedImages, EmbeddedTables
+from mm_doc_proc.utils.openai_utils import call_llm, call_llm_structured_outputs, call_llm_async, call_llm_structured_outputs_async
+from mm_doc_proc.utils.openai_utils import build_messages, build_structured_messages, chat_request_body
+from mm_doc_proc.multimodal_processing_pipeline.data_models import EmbeddedImages, EmbeddedTables, EmbeddedImagesAndTables, PageTriage
+from mm_doc_proc.multimodal_processing_pipeline.llm_result_cache import cached_llm_call, cached_llm_call_async
+from mm_doc_proc.utils.prompt_registry import get_prompt
 
 
 module_directory = os.path.dirname(os.path.abspath(__file__))
@@ -41,125 +44,395 @@ def get_image_base64(image_path):
         return encoded_string.decode('ascii')
 
 
-def analyze_images(image_path, model_info=None):
+def read_image_bytes(image_path):
+    """
+    Reads the raw bytes of an image file, used to content-address page images.
+    """
+    with open(image_path, "rb") as image_file:
+        return image_file.read()
+
+
+def triage_page(page, min_vector_drawings=20, min_image_area_ratio=0.01):
+    """
+    Decides locally, from what fitz exposes about the page, whether the multimodal
+    image and table analysis calls are needed.
+
+    Args:
+        page (fitz.Page): The PDF page.
+        min_vector_drawings (int): Number of vector drawings from which a page may hold a chart or a ruled table.
+        min_image_area_ratio (float): Embedded images smaller than this fraction of the page are ignored (logos, bullets).
+
+    Returns:
+        PageTriage: The decision and the signals it was based on.
+    """
+    page_area = abs(page.rect) or 1
+    embedded_images = [
+        info for info in page.get_image_info()
+        if bbox_area(info.get("bbox")) / page_area >= min_image_area_ratio
+    ]
+    vector_drawing_count = len(page.get_drawings())
+
+    borderless_table_count = 0
+    try:
+        detected_table_count = len(page.find_tables().tables)
+        if detected_table_count == 0:
+            # The default "lines" strategy only finds ruled tables, so also look for column-aligned text
+            borderless_table_count = sum(
+                1 for table in page.find_tables(strategy="text").tables
+                if table.row_count >= 2 and table.col_count >= 2
+            )
+            detected_table_count = borderless_table_count
+    except AttributeError:
+        # PyMuPDF < 1.23 has no table finder, so tables can't be ruled out locally
+        detected_table_count = None
+
+    has_vector_graphics = vector_drawing_count >= min_vector_drawings
+    needs_image_analysis = bool(embedded_images) or has_vector_graphics
+    needs_table_analysis = detected_table_count is None or detected_table_count > 0 or has_vector_graphics
+
+    if detected_table_count is None:
+        table_reason = "table finder unavailable"
+    elif borderless_table_count:
+        table_reason = f"{borderless_table_count} borderless table(s) found"
+    else:
+        table_reason = f"{detected_table_count} table(s) found"
+    reason = f"{len(embedded_images)} embedded image(s), {vector_drawing_count} vector drawing(s), {table_reason}"
+
+    return PageTriage(
+        needs_image_analysis=needs_image_analysis,
+        needs_table_analysis=needs_table_analysis,
+        reason=reason,
+        embedded_image_count=len(embedded_images),
+        vector_drawing_count=vector_drawing_count,
+        detected_table_count=detected_table_count or 0
+    )
+
+
+def bbox_area(bbox):
+    """
+    Area of an (x0, y0, x1, y1) bounding box.
+    """
+    if not bbox:
+        return 0
+    x0, y0, x1, y1 = bbox
+    return max(0, x1 - x0) * max(0, y1 - y0)
+
+
+def analyze_images(image_path, model_info=None, usage=None, cache=None, image_bytes=None):
     """
     Analyzes an image and generates descriptions or explanations.
 
     Args:
         image_path (str): Path to the image file.
         model_info (dict): Information about the model configuration.
+        usage (TokenUsage): Optional accumulator for the tokens spent on the call.
+        cache (LLMResultCache): Optional cache consulted before making the call.
+        image_bytes (bytes): Optional in-memory JPEG of the page; if given, image_path is not read.
 
     Returns:
         str: Analysis response.
         str: Generated text filename.
     """
-    prompt_path = locate_ingestion_prompt('image_description_prompt.txt',os.path.dirname(os.path.abspath(__file__)))
-    image_prompt = read_asset_file(prompt_path)[0]
-    image_path = convert_png_to_jpg(image_path)  # Ensure the image is in JPG format
-
-    response = call_llm_structured_outputs(
-        imgs=image_path,
-        prompt=image_prompt,
-        model_info=model_info,
+    image_prompt = get_prompt('image_description_prompt.txt')
+    if image_bytes is None:
+        image_path = convert_png_to_jpg(image_path)  # Ensure the image is in JPG format
+        image_bytes = read_image_bytes(image_path)
+
+    response = cached_llm_call(
+        cache, 'analyze_images', image_bytes, image_prompt, model_info,
+        lambda: call_llm_structured_outputs(
+            imgs=image_bytes,
+            prompt=image_prompt,
+            model_info=model_info,
+            response_format=EmbeddedImages,
+            usage=usage
+        ),
         response_format=EmbeddedImages
     )
 
     return response
 
 
-def analyze_tables(image_path, model_info=None):
+def analyze_tables(image_path, model_info=None, usage=None, cache=None, image_bytes=None):
     """
     Analyzes an image to extract table data and formats it as Markdown.
 
     Args:
         image_path (str): Path to the image file.
         model_info (dict): Information about the model configuration.
+        usage (TokenUsage): Optional accumulator for the tokens spent on the call.
+        cache (LLMResultCache): Optional cache consulted before making the call.
+        image_bytes (bytes): Optional in-memory JPEG of the page; if given, image_path is not read.
 
     Returns:
         str: Table analysis response.
         str: Generated Markdown filename.
     """
-    prompt_path = locate_ingestion_prompt('table_description_prompt.txt', os.path.dirname(os.path.abspath(__file__)))
-    table_prompt = read_asset_file(prompt_path)[0]
-    image_path = convert_png_to_jpg(image_path)  # Ensure the image is in JPG format
-
-    response = call_llm_structured_outputs(
-        imgs=image_path,
-        prompt=table_prompt,
-        model_info=model_info,
+    table_prompt = get_prompt('table_description_prompt.txt')
+    if image_bytes is None:
+        image_path = convert_png_to_jpg(image_path)  # Ensure the image is in JPG format
+        image_bytes = read_image_bytes(image_path)
+
+    response = cached_llm_call(
+        cache, 'analyze_tables', image_bytes, table_prompt, model_info,
+        lambda: call_llm_structured_outputs(
+            imgs=image_bytes,
+            prompt=table_prompt,
+            model_info=model_info,
+            response_format=EmbeddedTables,
+            usage=usage
+        ),
         response_format=EmbeddedTables
     )
 
     return response
 
 
-def process_text(text, model_info=None):
+def analyze_images_and_tables(image_path, model_info=None, usage=None, cache=None, image_bytes=None):
+    """
+    Analyzes an image for both embedded images and tables in a single call,
+    so the page image is only sent to the model once.
+
+    Args:
+        image_path (str): Path to the image file.
+        model_info (dict): Information about the model configuration.
+        usage (TokenUsage): Optional accumulator for the tokens spent on the call.
+        cache (LLMResultCache): Optional cache consulted before making the call.
+        image_bytes (bytes): Optional in-memory JPEG of the page; if given, image_path is not read.
+
+    Returns:
+        EmbeddedImagesAndTables: Combined image and table analysis response.
+    """
+    image_and_table_prompt = get_prompt('image_and_table_description_prompt.txt')
+    if image_bytes is None:
+        image_path = convert_png_to_jpg(image_path)  # Ensure the image is in JPG format
+        image_bytes = read_image_bytes(image_path)
+
+    response = cached_llm_call(
+        cache, 'analyze_images_and_tables', image_bytes, image_and_table_prompt, model_info,
+        lambda: call_llm_structured_outputs(
+            imgs=image_bytes,
+            prompt=image_and_table_prompt,
+            model_info=model_info,
+            response_format=EmbeddedImagesAndTables,
+            usage=usage
+        ),
+        response_format=EmbeddedImagesAndTables
+    )
+
+    return response
+
+
+def process_text(text, model_info=None, usage=None, cache=None):
     """
     Processes text using a language model.
 
     Args:
         text (str): The input text to process.
         model_info (dict): Information about the model configuration.
+        usage (TokenUsage): Optional accumulator for the tokens spent on the call.
+        cache (LLMResultCache): Optional cache consulted before making the call.
 
     Returns:
         str: Processed text.
     """
 
-    prompt_path = locate_ingestion_prompt('process_extracted_text_prompt.txt',os.path.dirname(os.path.abspath(__file__)))
-    process_text_prompt = read_asset_file(prompt_path)[0]
+    process_text_prompt = get_prompt('process_extracted_text_prompt.txt')
 
     prompt = process_text_prompt.format(text=text)
 
-    response = call_llm(
-        prompt,
-        model_info=model_info
+    response = cached_llm_call(
+        cache, 'process_text', text, process_text_prompt, model_info,
+        lambda: call_llm(
+            prompt,
+            model_info=model_info,
+            usage=usage
+        )
     )
 
     return response
 
 
-def condense_text(text, model_info=None):
+def condense_text(text, model_info=None, usage=None, cache=None):
     """
     Condenses text to a specified number of tokens.
 
     Args:
         text (str): The input text to condense.
         model_info (dict): Information about the model configuration.
+        usage (TokenUsage): Optional accumulator for the tokens spent on the call.
+        cache (LLMResultCache): Optional cache consulted before making the call.
 
     Returns:
         str: Condensed text.
     """
-    prompt_path = locate_ingestion_prompt('document_condensation_prompt.txt')
-    condense_text_prompt = read_asset_file(prompt_path)[0]
+    condense_text_prompt = get_prompt('document_condensation_prompt.txt')
     prompt = condense_text_prompt.format(document=text)
 
-    response = call_llm(
-        prompt,
-        model_info=model_info
+    response = cached_llm_call(
+        cache, 'condense_text', text, condense_text_prompt, model_info,
+        lambda: call_llm(
+            prompt,
+            model_info=model_info,
+            usage=usage
+        )
     )
 
     return response
 
 
 
-def generate_table_of_contents(text, model_info=None):
+def generate_table_of_contents(text, model_info=None, usage=None, cache=None):
     """
     Generates a table of contents.
 
     Args:
         text (str): The input text to use.
         model_info (dict): Information about the model configuration.
+        usage (TokenUsage): Optional accumulator for the tokens spent on the call.
+        cache (LLMResultCache): Optional cache consulted before making the call.
 
     Returns:
         str: Table of contents.
     """
-    prompt_path = locate_ingestion_prompt('table_of_contents_prompt.txt')
-    toc_text_prompt = read_asset_file(prompt_path)[0]
+    toc_text_prompt = get_prompt('table_of_contents_prompt.txt')
     prompt = toc_text_prompt.format(document=text)
 
-    response = call_llm(
-        prompt,
-        model_info=model_info
+    response = cached_llm_call(
+        cache, 'generate_table_of_contents', text, toc_text_prompt, model_info,
+        lambda: call_llm(
+            prompt,
+            model_info=model_info,
+            usage=usage
+        )
+    )
+
+    return response
+
+
+###############################################################################
+# Async variants used by PDFIngestionPipeline.process_pdf_async
+###############################################################################
+
+
+async def _analyze_page_image_async(kind, prompt_name, response_format, image_path, model_info=None, usage=None, cache=None, image_bytes=None):
+    page_prompt = get_prompt(prompt_name)
+    if image_bytes is None:
+        image_path = convert_png_to_jpg(image_path)  # Ensure the image is in JPG format
+        image_bytes = read_image_bytes(image_path)
+
+    return await cached_llm_call_async(
+        cache, kind, image_bytes, page_prompt, model_info,
+        lambda: call_llm_structured_outputs_async(
+            imgs=image_bytes,
+            prompt=page_prompt,
+            model_info=model_info,
+            response_format=response_format,
+            usage=usage
+        ),
+        response_format=response_format
+    )
+
+
+async def analyze_images_async(image_path, model_info=None, usage=None, cache=None, image_bytes=None):
+    """
+    Async version of analyze_images.
+    """
+    return await _analyze_page_image_async('analyze_images', 'image_description_prompt.txt', EmbeddedImages,
+                                           image_path, model_info, usage, cache, image_bytes)
+
+
+async def analyze_tables_async(image_path, model_info=None, usage=None, cache=None, image_bytes=None):
+    """
+    Async version of analyze_tables.
+    """
+    return await _analyze_page_image_async('analyze_tables', 'table_description_prompt.txt', EmbeddedTables,
+                                           image_path, model_info, usage, cache, image_bytes)
+
+
+async def analyze_images_and_tables_async(image_path, model_info=None, usage=None, cache=None, image_bytes=None):
+    """
+    Async version of analyze_images_and_tables.
+    """
+    return await _analyze_page_image_async('analyze_images_and_tables', 'image_and_table_description_prompt.txt', EmbeddedImagesAndTables,
+                                           image_path, model_info, usage, cache, image_bytes)
+
+
+async def _process_document_text_async(kind, prompt_name, format_key, text, model_info=None, usage=None, cache=None):
+    text_prompt = get_prompt(prompt_name)
+    prompt = text_prompt.format(**{format_key: text})
+
+    return await cached_llm_call_async(
+        cache, kind, text, text_prompt, model_info,
+        lambda: call_llm_async(
+            prompt,
+            model_info=model_info,
+            usage=usage
+        )
     )
 
-    return response
\ No newline at end of file
+
+async def process_text_async(text, model_info=None, usage=None, cache=None):
+    """
+    Async version of process_text.
+    """
+    return await _process_document_text_async('process_text', 'process_extracted_text_prompt.txt', 'text',
+                                              text, model_info, usage, cache)
+
+
+async def condense_text_async(text, model_info=None, usage=None, cache=None):
+    """
+    Async version of condense_text.
+    """
+    return await _process_document_text_async('condense_text', 'document_condensation_prompt.txt', 'document',
+                                              text, model_info, usage, cache)
+
+
+async def generate_table_of_contents_async(text, model_info=None, usage=None, cache=None):
+    """
+    Async version of generate_table_of_contents.
+    """
+    return await _process_document_text_async('generate_table_of_contents', 'table_of_contents_prompt.txt', 'document',
+                                              text, model_info, usage, cache)
+
+
+
+###############################################################################
+# Batch requests used by PDFIngestionPipeline.process_pdf_batch
+###############################################################################
+
+
+# kind -> (prompt file, prompt placeholder for text calls, structured response format for page image calls)
+LLM_CALL_KINDS = {
+    'process_text': ('process_extracted_text_prompt.txt', 'text', None),
+    'condense_text': ('document_condensation_prompt.txt', 'document', None),
+    'generate_table_of_contents': ('table_of_contents_prompt.txt', 'document', None),
+    'analyze_images': ('image_description_prompt.txt', None, EmbeddedImages),
+    'analyze_tables': ('table_description_prompt.txt', None, EmbeddedTables),
+    'analyze_images_and_tables': ('image_and_table_description_prompt.txt', None, EmbeddedImagesAndTables),
+}
+
+
+def prepare_llm_request(kind, content, model_info):
+    """
+    Build the request the live helper for this kind of call would send, without sending it.
+
+    Args:
+        kind (str): One of LLM_CALL_KINDS, e.g. 'process_text' or 'analyze_images'.
+        content (str or bytes): The text to process, or the in-memory JPEG of the page.
+        model_info (dict): Information about the model configuration.
+
+    Returns:
+        str: The prompt template, as used in LLM result cache keys.
+        dict: The chat completions request body.
+        type: The structured response format, or None for text calls.
+    """
+    prompt_name, format_key, response_format = LLM_CALL_KINDS[kind]
+    prompt_template = get_prompt(prompt_name)
+
+    if response_format is None:
+        messages = build_messages(prompt_template.format(**{format_key: content}))
+    else:
+        messages = build_structured_messages(prompt_template, content)
+
+    return prompt_template, chat_request_body(messages, model_info, response_format=response_format), response_format
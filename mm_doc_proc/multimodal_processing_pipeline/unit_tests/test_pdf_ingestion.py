@@ -1,5 +1,7 @@
 import os
 import shutil
+import asyncio
+import fitz
 import pytest
 from pathlib import Path
 
@@ -11,7 +13,15 @@ sys.path.append('../../')
 from configuration_models import ProcessingPipelineConfiguration
 from pdf_ingestion_pipeline import PDFIngestionPipeline  
 from data_models import DocumentContent
+from batch_backend import write_batch_requests, parse_jsonl
+from pipeline_utils import triage_page
 from utils.file_utils import read_json_file
+from utils.prompt_registry import PromptRegistry, PROMPT_DIRECTORIES
+from utils.openai_utils import pack_embedding_batches
+from utils.embedding_cache import EmbeddingCache
+from utils.tokenizer import encoding_name_for_model, get_encoding, count_tokens, count_tokens_batch
+from utils.text_chunker import chunk_text
+from utils.lexical_index import BM25Index
 
 # ------------------------------------------------------------------------------
 # Helpers & Fixtures
@@ -351,3 +361,592 @@ def test_process_pages_as_png(sample_pdf_path, output_dir):
 
     assert len(page_pngs) > 0, "No PNG files found despite process_pages_as_jpg=False."
     assert len(page_jpgs) == 0, "Found JPG files even though process_pages_as_jpg=False."
+
+
+# ------------------------------------------------------------------------------
+# Test: Concurrent Page Processing
+# ------------------------------------------------------------------------------
+def test_concurrent_page_processing(sample_pdf_path, output_dir):
+    """
+    With max_concurrent_pages > 1, all pages must still be processed and
+    returned in page order, and full_text must follow the same order.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=True,
+        process_tables=True,
+        save_text_files=True,
+        generate_condensed_text=False,
+        generate_table_of_contents=False,
+        max_concurrent_pages=4
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document = pipeline.process_pdf()
+
+    page_numbers = [p.page_number for p in document.pages]
+    assert page_numbers == list(range(1, document.metadata.total_pages + 1)), (
+        "Pages are missing or out of order after concurrent processing."
+    )
+
+    expected_full_text = "\n".join(p.page_text.text for p in document.pages)
+    assert document.full_text == expected_full_text, "full_text was not assembled in page order."
+
+
+# ------------------------------------------------------------------------------
+# Test: Combined Image and Table Analysis
+# ------------------------------------------------------------------------------
+def test_combined_image_and_table_analysis(sample_pdf_path, output_dir):
+    """
+    With combine_image_and_table_analysis=True, each page should make one
+    multimodal call (plus the text call) and report its token usage.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=True,
+        process_tables=True,
+        combine_image_and_table_analysis=True,
+        save_text_files=True,
+        generate_condensed_text=False,
+        generate_table_of_contents=False
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document = pipeline.process_pdf()
+
+    for page in document.pages:
+        assert page.token_usage is not None, "token_usage missing from page content"
+        assert page.token_usage.llm_calls == 2, "Expected one text call and one combined multimodal call per page."
+        assert page.token_usage.prompt_tokens > 0, "Prompt tokens were not recorded."
+
+    assert document.token_usage.llm_calls == 2 * len(document.pages)
+
+
+# ------------------------------------------------------------------------------
+# Test: LLM Result Cache
+# ------------------------------------------------------------------------------
+def test_llm_cache_rerun_makes_no_llm_calls(sample_pdf_path, tmp_path):
+    """
+    Re-ingesting an unchanged document with the LLM cache enabled must not make
+    any LLM calls, even when the output directory is different.
+    """
+    cache_dir = str(tmp_path / "llm_cache")
+
+    def make_config(output_directory):
+        return ProcessingPipelineConfiguration(
+            pdf_path=sample_pdf_path,
+            output_directory=output_directory,
+            process_text=True,
+            process_images=True,
+            process_tables=True,
+            save_text_files=True,
+            generate_condensed_text=False,
+            generate_table_of_contents=False,
+            llm_cache_directory=cache_dir
+        )
+
+    first_run = PDFIngestionPipeline(make_config(str(tmp_path / "output_1")))
+    first_document = first_run.process_pdf()
+    assert first_document.token_usage.llm_calls > 0
+    assert first_run.llm_cache.stats()["misses"] > 0
+
+    second_run = PDFIngestionPipeline(make_config(str(tmp_path / "output_2")))
+    second_document = second_run.process_pdf()
+    assert second_document.token_usage.llm_calls == 0, "LLM calls were made although all results were cached."
+    assert second_run.llm_cache.stats()["misses"] == 0
+    assert second_run.llm_cache.stats()["hits"] == first_run.llm_cache.stats()["misses"]
+
+    for first_page, second_page in zip(first_document.pages, second_document.pages):
+        assert first_page.text.text.text == second_page.text.text.text
+
+
+# ------------------------------------------------------------------------------
+# Test: Resume From Page Checkpoints
+# ------------------------------------------------------------------------------
+def test_resume_from_page_checkpoints(sample_pdf_path, output_dir):
+    """
+    Simulate an interrupted run by deleting the last page's checkpoint, then
+    resume: only the missing page should be processed again.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=False,
+        process_tables=False,
+        save_text_files=True,
+        generate_condensed_text=False,
+        generate_table_of_contents=False
+    )
+
+    first_document = PDFIngestionPipeline(config).process_pdf()
+    total_pages = first_document.metadata.total_pages
+
+    checkpoints = list((Path(output_dir) / "pages").glob("page_*/page_content.json"))
+    assert len(checkpoints) == total_pages, "Not every page was checkpointed."
+
+    (Path(output_dir) / "pages" / f"page_{total_pages}" / "page_content.json").unlink()
+
+    config.resume = True
+    pipeline = PDFIngestionPipeline(config)
+    processed = []
+    original_process_page = pipeline._process_page
+    pipeline._process_page = lambda n: processed.append(n) or original_process_page(n)
+
+    resumed_document = pipeline.process_pdf()
+
+    assert processed == [total_pages], "Resume re-processed pages that were already checkpointed."
+    assert [p.page_number for p in resumed_document.pages] == list(range(1, total_pages + 1))
+
+
+def test_resume_ignores_checkpoints_of_other_config(sample_pdf_path, output_dir):
+    """
+    Checkpoints written with other page settings (here the page image DPI) must not be
+    resumed from: every page is processed again.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=False,
+        process_tables=False,
+        save_text_files=True,
+        generate_condensed_text=False,
+        generate_table_of_contents=False
+    )
+
+    first_document = PDFIngestionPipeline(config).process_pdf()
+    total_pages = first_document.metadata.total_pages
+
+    config.resume = True
+    config.page_image_dpi = config.page_image_dpi // 2
+    pipeline = PDFIngestionPipeline(config)
+    assert pipeline._load_page_checkpoints() == {}, "Checkpoints of another config were loaded."
+
+    processed = []
+    original_process_page = pipeline._process_page
+    pipeline._process_page = lambda n: processed.append(n) or original_process_page(n)
+    pipeline.process_pdf()
+
+    assert sorted(processed) == list(range(1, total_pages + 1))
+
+
+# ------------------------------------------------------------------------------
+# Test: In-Memory Page Rendering Without Saving Page Images
+# ------------------------------------------------------------------------------
+def test_in_memory_rendering_without_saving_page_images(sample_pdf_path, output_dir):
+    """
+    With save_page_images=False, pages are still analyzed by the multimodal
+    model (from in-memory JPEG bytes) but no page image is written to disk.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        save_page_images=False,
+        page_image_dpi=150,
+        page_image_jpg_quality=70,
+        process_text=False,
+        process_images=True,
+        process_tables=True,
+        save_text_files=False,
+        generate_condensed_text=False,
+        generate_table_of_contents=False
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document = pipeline.process_pdf()
+
+    pages_dir = Path(output_dir) / "pages"
+    assert len(list(pages_dir.glob("**/*.jpg"))) == 0, "Page images were written although save_page_images=False."
+    assert len(list(pages_dir.glob("**/*.png"))) == 0, "Page images were written although save_page_images=False."
+    assert all(p.page_image_path == "" for p in document.pages)
+    assert all(p.token_usage.llm_calls == 2 for p in document.pages), "Images and tables were not analyzed."
+
+
+# ------------------------------------------------------------------------------
+# Test: Local Page Triage
+# ------------------------------------------------------------------------------
+def test_page_triage(sample_pdf_path, output_dir):
+    """
+    With triage_pages=True, every page records its triage decision, and the
+    image/table LLM calls are only made when the triage asks for them.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=False,
+        process_images=True,
+        process_tables=True,
+        triage_pages=True,
+        save_text_files=False,
+        generate_condensed_text=False,
+        generate_table_of_contents=False
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document = pipeline.process_pdf()
+
+    for page in document.pages:
+        assert page.triage is not None, "Triage decision missing from page content."
+        assert page.triage.reason, "Triage reason missing."
+        expected_calls = int(page.triage.needs_image_analysis) + int(page.triage.needs_table_analysis)
+        assert page.token_usage.llm_calls == expected_calls
+        assert page.triage.skipped_llm_calls == 2 - expected_calls
+        if not page.triage.needs_image_analysis:
+            assert page.images == []
+        if not page.triage.needs_table_analysis:
+            assert page.tables == []
+
+
+# ------------------------------------------------------------------------------
+# Test: Triage Of Borderless Tables
+# ------------------------------------------------------------------------------
+def test_triage_finds_borderless_tables():
+    """
+    A table without ruled borders, on a page with no images or drawings,
+    should still be sent to table analysis.
+    """
+    document = fitz.open()
+    page = document.new_page()
+    rows = [("Region", "Revenue", "Growth")] + [(f"Region {n}", f"{n * 1000}", f"{n}%") for n in range(1, 9)]
+    for row_number, row in enumerate(rows):
+        for column_number, cell in enumerate(row):
+            page.insert_text((72 + 150 * column_number, 100 + 20 * row_number), cell, fontsize=11)
+
+    triage = triage_page(page)
+    assert triage.vector_drawing_count == 0
+    assert triage.detected_table_count >= 1
+    assert triage.needs_table_analysis
+    assert not triage.needs_image_analysis
+
+
+# ------------------------------------------------------------------------------
+# Test: Streaming Pages With iter_pages
+# ------------------------------------------------------------------------------
+def test_iter_pages_streams_pages_then_finalizes(sample_pdf_path, output_dir):
+    """
+    iter_pages should yield every page before the document-level outputs exist,
+    and finalize the document once the iterator is exhausted.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=False,
+        process_tables=False,
+        save_text_files=True,
+        generate_condensed_text=False,
+        generate_table_of_contents=False,
+        max_concurrent_pages=2
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document_content_path = Path(output_dir) / "document_content.json"
+
+    streamed_page_numbers = []
+    for page_content in pipeline.iter_pages():
+        assert not document_content_path.exists(), "Document was finalized before all pages were yielded."
+        streamed_page_numbers.append(page_content.page_number)
+
+    assert sorted(streamed_page_numbers) == list(range(1, pipeline.metadata.total_pages + 1))
+    assert document_content_path.is_file(), "document_content.json not written after the iterator was exhausted."
+    assert [p.page_number for p in pipeline.document.pages] == sorted(streamed_page_numbers)
+
+
+# ------------------------------------------------------------------------------
+# Test: Async Processing
+# ------------------------------------------------------------------------------
+def test_process_pdf_async(sample_pdf_path, output_dir):
+    """
+    process_pdf_async should produce the same document structure as process_pdf,
+    with every page in page order and the per-page outputs on disk.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=True,
+        process_tables=True,
+        save_text_files=True,
+        generate_condensed_text=True,
+        generate_table_of_contents=False,
+        max_concurrent_pages=4
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document_content = asyncio.run(pipeline.process_pdf_async())
+
+    assert isinstance(document_content, DocumentContent)
+    assert [p.page_number for p in document_content.pages] == list(range(1, document_content.metadata.total_pages + 1))
+    assert document_content.token_usage.llm_calls > 0
+
+    for page in document_content.pages:
+        page_dir = Path(output_dir) / "pages" / f"page_{page.page_number}"
+        assert (page_dir / f"page_{page.page_number}.txt").is_file()
+        assert (page_dir / f"page_{page.page_number}_twin.txt").is_file()
+
+    assert (Path(output_dir) / "condensed_text.md").is_file()
+    assert (Path(output_dir) / "document_content.json").is_file()
+
+
+# ------------------------------------------------------------------------------
+# Test: Batch Mode With The Local Batch Backend
+# ------------------------------------------------------------------------------
+def test_process_pdf_batch_local_backend(sample_pdf_path, output_dir):
+    """
+    In batch mode, the page requests should be written as a JSONL batch file,
+    run by the local file-based backend, and mapped back into the pages.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=True,
+        process_tables=True,
+        save_text_files=True,
+        generate_condensed_text=True,
+        generate_table_of_contents=False,
+        batch_mode=True,
+        batch_backend="local",
+        batch_poll_interval=1
+    )
+
+    pipeline = PDFIngestionPipeline(config)
+    document_content = pipeline.process_pdf()
+
+    batch_dir = Path(output_dir) / "batch"
+    request_files = list(batch_dir.glob("pages_*_requests.jsonl"))
+    assert request_files, "No batch request file was written."
+    total_requests = sum(len(f.read_text().splitlines()) for f in request_files)
+    assert total_requests == 3 * document_content.metadata.total_pages
+    assert list(batch_dir.glob("local_batch_*_output.jsonl")), "The local backend wrote no output."
+
+    assert [p.page_number for p in document_content.pages] == list(range(1, document_content.metadata.total_pages + 1))
+    for page in document_content.pages:
+        assert page.text.processed_or_raw_text
+        assert page.token_usage.llm_calls == 3
+    assert (Path(output_dir) / "condensed_text.md").is_file()
+
+
+# ------------------------------------------------------------------------------
+# Test: Splitting Batch Input Files
+# ------------------------------------------------------------------------------
+def test_write_batch_requests_splits_to_file_limits(tmp_path):
+    """
+    Batch input should be split into files within the per-file request
+    count and byte size limits, keeping every request exactly once.
+    """
+    requests = {f"page_{n}": {"messages": [{"role": "user", "content": "x" * 1000}]} for n in range(10)}
+
+    paths = write_batch_requests(requests, tmp_path, "pages_1", "/chat/completions", max_requests=4)
+    assert [path.name for path in paths] == ["pages_1_1_requests.jsonl", "pages_1_2_requests.jsonl", "pages_1_3_requests.jsonl"]
+    assert [len(parse_jsonl(path.read_text())) for path in paths] == [4, 4, 2]
+
+    paths = write_batch_requests(requests, tmp_path / "by_size", "pages_1", "/chat/completions", max_file_bytes=2500)
+    assert len(paths) == 5
+    assert all(path.stat().st_size <= 2500 for path in paths)
+    custom_ids = [line["custom_id"] for path in paths for line in parse_jsonl(path.read_text())]
+    assert custom_ids == list(requests)
+
+
+# ------------------------------------------------------------------------------
+# Test: Prompt Registry
+# ------------------------------------------------------------------------------
+def test_prompt_registry(tmp_path):
+    """
+    All shipped prompts should load and validate, and a changed prompt file
+    should only be picked up with hot_reload on.
+    """
+    registry = PromptRegistry(PROMPT_DIRECTORIES)
+    assert "image_description_prompt.txt" in registry.names()
+    assert "search_expansion_prompt.txt" in registry.names()
+    assert "{document}" in registry.get("table_of_contents_prompt.txt")
+
+    prompt_file = tmp_path / "process_extracted_text_prompt.txt"
+    prompt_file.write_text("Clean up this text: {text}", encoding="utf-8")
+    static_registry = PromptRegistry([tmp_path])
+    hot_registry = PromptRegistry([tmp_path], hot_reload=True)
+
+    prompt_file.write_text("Clean up and fix this text: {text}", encoding="utf-8")
+    os.utime(prompt_file, (prompt_file.stat().st_atime, prompt_file.stat().st_mtime + 10))
+
+    assert static_registry.get("process_extracted_text_prompt.txt") == "Clean up this text: {text}"
+    assert hot_registry.get("process_extracted_text_prompt.txt") == "Clean up and fix this text: {text}"
+
+    prompt_file.write_text("Clean up this text: {txt}", encoding="utf-8")
+    with pytest.raises(ValueError):
+        PromptRegistry([tmp_path])
+
+    # Prompts that are not templated may contain literal braces
+    prompt_file.write_text("Clean up this text: {text}", encoding="utf-8")
+    (tmp_path / "json_example_prompt.txt").write_text('Answer like {"score": 90}', encoding="utf-8")
+    assert PromptRegistry([tmp_path]).get("json_example_prompt.txt") == 'Answer like {"score": 90}'
+
+
+# ------------------------------------------------------------------------------
+# Test: LLM Call Telemetry
+# ------------------------------------------------------------------------------
+def test_llm_telemetry_json(sample_pdf_path, output_dir):
+    """
+    Every page's LLM calls should be recorded under their stage, with token
+    counts and latencies, and saved to llm_telemetry.json at the end of the run.
+    """
+    config = ProcessingPipelineConfiguration(
+        pdf_path=sample_pdf_path,
+        output_directory=output_dir,
+        process_text=True,
+        process_images=False,
+        process_tables=False,
+        save_text_files=False,
+        generate_condensed_text=False,
+        generate_table_of_contents=False,
+        max_concurrent_pages=4
+    )
+    pipeline = PDFIngestionPipeline(config)
+    document_content = pipeline.process_pdf()
+
+    telemetry_path = Path(output_dir) / "llm_telemetry.json"
+    assert telemetry_path.is_file(), "llm_telemetry.json not found."
+    telemetry_data = read_json_file(telemetry_path)
+
+    total_pages = document_content.metadata.total_pages
+    assert len(telemetry_data["calls"]) == total_pages
+    assert telemetry_data["summary"]["process_text"]["calls"] == total_pages
+    assert telemetry_data["summary"]["process_text"]["prompt_tokens"] == document_content.token_usage.prompt_tokens
+    for call in telemetry_data["calls"]:
+        assert call["stage"] == "process_text"
+        assert call["outcome"] == "success"
+        assert call["latency_seconds"] > 0
+
+
+# ------------------------------------------------------------------------------
+# Test: Embedding Request Packing
+# ------------------------------------------------------------------------------
+def test_pack_embedding_batches():
+    """
+    Embedding inputs should be packed in order into batches that respect both
+    the input count and the token limits, with no input dropped or repeated.
+    """
+    token_counts = [100, 200, 300, 50, 8000, 10, 10, 10]
+    batches = pack_embedding_batches(token_counts, max_batch_inputs=3, max_batch_tokens=600)
+
+    assert [i for batch in batches for i in batch] == list(range(len(token_counts)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or sum(token_counts[i] for i in batch) <= 600
+    assert [4] in batches, "An input larger than the token budget should get a batch of its own."
+    assert pack_embedding_batches([]) == []
+
+
+# ------------------------------------------------------------------------------
+# Test: Embedding Cache
+# ------------------------------------------------------------------------------
+def test_embedding_cache(tmp_path):
+    """
+    Vectors should be found again by normalized text, model and dimensions,
+    survive reopening the cache, and be evicted least recently used first.
+    """
+    cache = EmbeddingCache(tmp_path / "embedding_cache")
+    key = EmbeddingCache.make_key("Hello   world\n", "text-embedding-3-small", 1536)
+    assert key == EmbeddingCache.make_key("Hello world", "text-embedding-3-small", 1536)
+    assert key != EmbeddingCache.make_key("Hello world", "text-embedding-3-large", 3072)
+
+    assert cache.get(key) is None
+    cache.put(key, [0.5, -0.25, 1.0])
+    cache.close()
+
+    reopened_cache = EmbeddingCache(tmp_path / "embedding_cache")
+    assert reopened_cache.get(key) == [0.5, -0.25, 1.0]
+    assert reopened_cache.stats()["hits"] == 1
+    assert reopened_cache.stats()["hit_rate"] == 1.0
+
+    small_cache = EmbeddingCache(tmp_path / "small_cache", max_size_mb=1)
+    vector = [0.0] * 65536  # 256 KB as float32
+    small_cache.put_many([(f"key_{i}", vector) for i in range(4)])
+    small_cache.get("key_0")
+    small_cache.put("key_4", vector)
+    assert small_cache.stats()["entries"] == 4
+    assert small_cache.get("key_0") is not None
+    assert small_cache.get("key_1") is None, "The least recently used vector should have been evicted."
+
+
+# ------------------------------------------------------------------------------
+# Test: Tokenizer Service
+# ------------------------------------------------------------------------------
+def test_tokenizer_service():
+    """
+    Models and deployment names should resolve to their encoding, encodings
+    should be loaded once, and batch counts should match single counts.
+    """
+    assert encoding_name_for_model("gpt-4o") == "o200k_base"
+    assert encoding_name_for_model("gpt-4o-prod-westeurope") == "o200k_base"
+    assert encoding_name_for_model("gpt-35-turbo") == "cl100k_base"
+    assert encoding_name_for_model("text-embedding-3-small") == "cl100k_base"
+    assert encoding_name_for_model("some-custom-deployment") == "o200k_base"
+    assert get_encoding("gpt-4o") is get_encoding("o1")
+
+    texts = ["Hello world", "", "A longer text <|endoftext|> with a special token string.", "Ünïcödé"] * 10
+    assert count_tokens_batch(texts) == [count_tokens(text) for text in texts]
+    assert count_tokens_batch([]) == []
+
+
+# ------------------------------------------------------------------------------
+# Test: Boundary-Aware Chunking
+# ------------------------------------------------------------------------------
+def test_chunk_text_prefers_page_boundaries():
+    """
+    Chunks should stay within the token limit, end at page markers when
+    there is one in reach, and cover the whole text without overlap by default.
+    """
+    pages = [f"##### --- Page {n} ---\n\n" + f"Paragraph {n}. " * 60 + "\n\n" for n in range(1, 21)]
+    text = "".join(pages)
+
+    chunks = chunk_text(text, max_tokens=1000)
+    assert len(chunks) > 1
+    assert "".join(chunk for chunk, _ in chunks) == text
+    for chunk, tokens in chunks:
+        assert tokens <= 1000
+        # Segments are tokenized separately, so merges across boundaries may differ slightly
+        assert abs(tokens - count_tokens(chunk)) <= len(chunk.split("\n\n"))
+        assert chunk.startswith("##### --- Page "), "Chunks should start at a page marker."
+
+    overlapping_chunks = chunk_text(text, max_tokens=1000, overlap_tokens=300)
+    assert len(overlapping_chunks) >= len(chunks)
+    assert all(tokens <= 1000 for _, tokens in overlapping_chunks)
+
+    assert chunk_text("Short text.", max_tokens=1000) == [("Short text.", count_tokens("Short text."))]
+
+
+# ------------------------------------------------------------------------------
+# Test: BM25 Document Shortlisting
+# ------------------------------------------------------------------------------
+def test_bm25_index_incremental_updates():
+    """
+    The index should rank documents by their match with the query, and
+    reflect replaced and removed documents without being rebuilt.
+    """
+    index = BM25Index()
+    index.add("report.pdf", "Quarterly revenue and profit report for 2023", version=1)
+    index.add("handbook.pdf", "Employee handbook: vacation policy and benefits", version=1)
+    index.add("forecast.pdf", "Revenue forecast", version=1)
+    for n in range(100):
+        index.add(f"other_{n}.pdf", f"Unrelated appendix number {n} about logistics")
+
+    results = index.search("What was the revenue in 2023?", top_k=2)
+    assert [name for name, _ in results] == ["report.pdf", "forecast.pdf"]
+    assert index.search("vacation", top_k=5)[0][0] == "handbook.pdf"
+    assert index.search("nothing matches this") == []
+
+    index.add("report.pdf", "Cooking recipes", version=2)
+    assert index.version("report.pdf") == 2
+    assert [name for name, _ in index.search("revenue")] == ["forecast.pdf"]
+
+    index.remove("forecast.pdf")
+    assert "forecast.pdf" not in index
+    assert index.search("revenue") == []
+    assert len(index) == 102
+
@@ -50,6 +50,7 @@ import sys
 sys.path.append("../")
 
 from utils.openai_utils import *
+from utils.embedding_cache import EmbeddingCache
 from multimodal_processing_pipeline.data_models import *
 from multimodal_processing_pipeline.pdf_ingestion_pipeline import *
 from search_data_models import *
@@ -78,18 +79,22 @@ class DynamicAzureIndexBuilder:
         api_key: str,
         index_name: str,
         embedding_model_info: EmbeddingModelnfo,
-        vector_profile_name: str = "myHnswProfile"
+        vector_profile_name: str = "myHnswProfile",
+        embedding_cache: Optional[EmbeddingCache] = None
     ):
         """
         :param endpoint: Your Azure Cognitive Search endpoint (e.g. https://<NAME>.search.windows.net)
         :param api_key: The Admin key for the search service
         :param index_name: The name of your index (must be lowercase in Azure Search)
+        :param embedding_cache: Embedding cache consulted before embedding text fields
+                                (defaults to the one in EMBEDDING_CACHE_DIRECTORY, if set)
         """
         self.endpoint = endpoint
         self.api_key = api_key
         self.index_name = index_name.lower()
         self.embedding_model_info = embedding_model_info
         self.vector_profile_name = vector_profile_name
+        self.embedding_cache = embedding_cache
         self.key_field_name = None
 
         # Clients
@@ -224,20 +229,19 @@ class DynamicAzureIndexBuilder:
             embedding_fields = []
 
         # Convert each model to dict, optionally injecting vector embeddings
-        documents_to_upload = []
-        for obj in model_objects:
-            doc = obj.dict()
+        documents_to_upload = [obj.dict() for obj in model_objects]
 
-            # For each field in embedding_fields, generate vector => store in e.g. "titleVector"
+        # For each field in embedding_fields, generate vector => store in e.g. "titleVector".
+        # All texts are embedded together, packed into as few concurrent requests as possible.
+        embedding_targets = []
+        for doc in documents_to_upload:
             for field_name in embedding_fields:
                 if field_name in doc and isinstance(doc[field_name], str):
-                    # generate embedding
-                    vector = get_embeddings(doc[field_name], self.embedding_model_info)
-                    # store as e.g. "titleVector"
-                    vector_field_name = embedding_fields[field_name]
-                    doc[vector_field_name] = vector
-            
-            documents_to_upload.append(doc)
+                    embedding_targets.append((doc, embedding_fields[field_name], doc[field_name]))
+
+        vectors = get_embeddings_batch([text for _, _, text in embedding_targets], self.embedding_model_info, cache=self.embedding_cache)
+        for (doc, vector_field_name, _), vector in zip(embedding_targets, vectors):
+            doc[vector_field_name] = vector
 
         if self.key_field_name is not None:
             # Ensure the key field is present in each document
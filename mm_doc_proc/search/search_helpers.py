@@ -10,13 +10,14 @@ from utils.openai_utils import *
 from multimodal_processing_pipeline.data_models import *
 from utils.file_utils import *
 from utils.text_utils import *
+from utils.prompt_registry import get_prompt
 from search_data_models import *
 
 
 
 
 def expand_searh_terms(query, model_info=None):
-    search_expansion_prompt = read_asset_file('search/search_prompts/search_expansion_prompt.txt')[0]
+    search_expansion_prompt = get_prompt('search_expansion_prompt.txt')
     prompt = search_expansion_prompt.format(query=query)
 
     response = call_llm_structured_outputs(
@@ -0,0 +1,228 @@
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from mm_doc_proc.utils.openai_data_models import DeploymentInfo, get_pooled_client, get_pooled_async_client
+from mm_doc_proc.utils.rate_limiter import (
+    RETRYABLE_ERRORS,
+    DeploymentRateLimiter,
+    configure_rate_limits,
+    get_rate_limiter,
+    retry_after_seconds,
+    single_attempt
+)
+
+from rich.console import Console
+console = Console()
+
+
+LATENCY_WINDOW = 50
+FAILURE_COOLDOWN_SECONDS = 10
+MIN_WEIGHT_FRACTION = 0.05
+
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+
+class _DeploymentState:
+    """
+    What the router knows about one deployment: its recent latencies and its rate limiter.
+    """
+
+    def __init__(self, deployment: DeploymentInfo):
+        self.deployment = deployment
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.limiter: Optional[DeploymentRateLimiter] = None
+
+    def p95_latency(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def remaining_fraction(self) -> float:
+        return self.limiter.remaining_fraction() if self.limiter is not None else 1.0
+
+
+class DeploymentRouter:
+    """
+    Spreads LLM calls over a pool of deployments of the same model.
+
+    Each call goes to a deployment picked at random, weighted by its configured weight, the
+    fraction of its quota still available and its recent p95 latency. A call that fails with a
+    429 or a transient error fails over to another deployment straight away; only once every
+    deployment has failed is the call retried (honouring Retry-After) on the best one.
+    If hedge_after_seconds is set, a call still running after that long is duplicated on a second
+    deployment and the first response wins.
+    """
+
+    def __init__(self, deployments: List[DeploymentInfo], hedge_after_seconds: Optional[float] = None):
+        self.states = [_DeploymentState(deployment) for deployment in deployments]
+        self.hedge_after_seconds = hedge_after_seconds
+
+    def _client(self, state: _DeploymentState, is_async: bool = False):
+        deployment = state.deployment
+        if is_async:
+            client = get_pooled_async_client(deployment.provider, deployment.endpoint, deployment.key, deployment.api_version)
+        else:
+            client = get_pooled_client(deployment.provider, deployment.endpoint, deployment.key, deployment.api_version)
+        configure_rate_limits(client, deployment)
+        if state.limiter is None:
+            state.limiter = get_rate_limiter(client, deployment.model)
+        return client
+
+    def _weight(self, state: _DeploymentState, default_latency: float) -> float:
+        latency = state.p95_latency() or default_latency
+        return state.deployment.weight * max(state.remaining_fraction(), MIN_WEIGHT_FRACTION) / max(latency, 1e-3)
+
+    def choose(self, exclude: Optional[List[_DeploymentState]] = None) -> Optional[_DeploymentState]:
+        """
+        Pick a deployment, excluding those already tried for this call.
+        """
+        candidates = [state for state in self.states if not exclude or state not in exclude]
+        if not candidates:
+            return None
+
+        # Deployments without latency samples yet are scored as fast as the fastest known one, so they get tried
+        known_latencies = [latency for latency in (state.p95_latency() for state in self.states) if latency is not None]
+        default_latency = min(known_latencies) if known_latencies else 1.0
+        weights = [self._weight(state, default_latency) for state in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    def _record_failure(self, state: _DeploymentState, error: Exception):
+        console.print(f"[bold yellow]Deployment {state.deployment.model} at {state.deployment.endpoint} failed, failing over:[/bold yellow] {error}")
+        # A 429 with Retry-After has already paused the deployment's limiter
+        if state.limiter is not None and retry_after_seconds(error) is None:
+            state.limiter.pause(FAILURE_COOLDOWN_SECONDS)
+
+    ###########################################################################
+    # Sync calls
+    ###########################################################################
+
+    def _timed_call(self, state: _DeploymentState, request: Callable[[Any, str], Any]) -> Any:
+        client = self._client(state)
+        start = time.perf_counter()
+        try:
+            result = request(client, state.deployment.model)
+        except RETRYABLE_ERRORS as e:
+            self._record_failure(state, e)
+            raise
+        state.latencies.append(time.perf_counter() - start)
+        return result
+
+    def _hedged_call(self, state: _DeploymentState, request: Callable[[Any, str], Any], tried: List[_DeploymentState]) -> Any:
+        if not self.hedge_after_seconds or len(self.states) < 2:
+            return self._timed_call(state, request)
+
+        futures = [_hedge_executor.submit(contextvars.copy_context().run, self._timed_call, state, request)]
+        done, _ = wait(futures, timeout=self.hedge_after_seconds)
+        if not done:
+            hedge_state = self.choose(exclude=tried)
+            if hedge_state is not None:
+                tried.append(hedge_state)
+                futures.append(_hedge_executor.submit(contextvars.copy_context().run, self._timed_call, hedge_state, request))
+
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        raise futures[0].exception()
+
+    def call(self, request: Callable[[Any, str], Any]) -> Any:
+        """
+        Make request(client, model) on a deployment of the pool, failing over and hedging as configured.
+        """
+        tried = []
+        while len(tried) < len(self.states):
+            state = self.choose(exclude=tried)
+            tried.append(state)
+            token = single_attempt.set(True)
+            try:
+                return self._hedged_call(state, request, tried)
+            except RETRYABLE_ERRORS:
+                pass
+            finally:
+                single_attempt.reset(token)
+
+        # Every deployment failed: wait for the best one with the usual Retry-After handling
+        return self._timed_call(self.choose(), request)
+
+    ###########################################################################
+    # Async calls
+    ###########################################################################
+
+    async def _timed_call_async(self, state: _DeploymentState, request: Callable[[Any, str], Awaitable[Any]]) -> Any:
+        client = self._client(state, is_async=True)
+        start = time.perf_counter()
+        try:
+            result = await request(client, state.deployment.model)
+        except RETRYABLE_ERRORS as e:
+            self._record_failure(state, e)
+            raise
+        state.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _hedged_call_async(self, state: _DeploymentState, request: Callable[[Any, str], Awaitable[Any]], tried: List[_DeploymentState]) -> Any:
+        if not self.hedge_after_seconds or len(self.states) < 2:
+            return await self._timed_call_async(state, request)
+
+        tasks = [asyncio.ensure_future(self._timed_call_async(state, request))]
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_after_seconds)
+        if not done:
+            hedge_state = self.choose(exclude=tried)
+            if hedge_state is not None:
+                tried.append(hedge_state)
+                tasks.append(asyncio.ensure_future(self._timed_call_async(hedge_state, request)))
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            raise tasks[0].exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call_async(self, request: Callable[[Any, str], Awaitable[Any]]) -> Any:
+        """
+        Async version of call: request(client, model) receives an async client and returns a coroutine.
+        """
+        tried = []
+        while len(tried) < len(self.states):
+            state = self.choose(exclude=tried)
+            tried.append(state)
+            token = single_attempt.set(True)
+            try:
+                return await self._hedged_call_async(state, request, tried)
+            except RETRYABLE_ERRORS:
+                pass
+            finally:
+                single_attempt.reset(token)
+
+        return await self._timed_call_async(self.choose(), request)
+
+
+_routers: Dict[Tuple, DeploymentRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(deployments: List[DeploymentInfo], hedge_after_seconds: Optional[float] = None) -> DeploymentRouter:
+    """
+    Return the process-wide router for this pool of deployments, so latency statistics are shared by all callers.
+    The router is keyed by the whole configuration of each deployment (including its weight and quotas),
+    so that a changed pool config gets a router of its own rather than the stale one.
+    """
+    key = (tuple(d.model_dump_json() for d in deployments), hedge_after_seconds)
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = DeploymentRouter(deployments, hedge_after_seconds=hedge_after_seconds)
+        return _routers[key]
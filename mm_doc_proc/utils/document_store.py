@@ -0,0 +1,47 @@
+import os
+import json
+import hashlib
+from typing import Any, Optional, Union
+
+from mm_doc_proc.utils.sqlite_lru_store import SQLiteLRUStore
+
+
+class DocumentStore:
+    """
+    Persistent store of processed documents (extracted chunks, their token counts and appendices).
+
+    Entries are keyed by the kind of entry, a hash of its content (the PDF or the chunk text) and
+    the settings that produced it. The store has its own SQLite file, separate from the LLM result
+    cache, so that clearing or resizing one never evicts entries of the other.
+    """
+
+    def __init__(self, store_directory: Union[str, os.PathLike], max_size_mb: int = 1024):
+        self._store = SQLiteLRUStore(store_directory, "document_store.sqlite", max_size_mb=max_size_mb)
+        self.store_path = self._store.path
+
+    @staticmethod
+    def make_key(kind: str, content: Union[str, bytes], config: str) -> str:
+        """
+        Build the key from the kind of entry, its content (or a hash of it) and the settings that produced it.
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        digest = hashlib.sha256()
+        for part in (kind.encode("utf-8"), hashlib.sha256(content).digest(), config.encode("utf-8")):
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        serialized = self._store.get(key)
+        return json.loads(serialized) if serialized is not None else None
+
+    def put(self, key: str, value: Any):
+        self._store.put(key, json.dumps(value))
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+    def close(self):
+        self._store.close()
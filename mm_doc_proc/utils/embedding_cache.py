@@ -0,0 +1,82 @@
+import os
+import re
+import array
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple, Union
+
+from mm_doc_proc.utils.sqlite_lru_store import SQLiteLRUStore
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embedding vectors, so that re-indexing unchanged text makes no embedding calls.
+
+    Entries are keyed by a hash of the normalized text (Unicode NFC, whitespace collapsed), the
+    embedding model name and the vector dimensions. Vectors are stored as float32 blobs in a SQLite
+    file, which is bounded in size by evicting the least recently used entries first.
+    """
+
+    def __init__(self, cache_directory: Union[str, os.PathLike], max_size_mb: int = 2048):
+        self._store = SQLiteLRUStore(
+            cache_directory, "embedding_cache.sqlite", max_size_mb=max_size_mb, table="embeddings", value_column="vector"
+        )
+        self.cache_path = self._store.path
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+    @staticmethod
+    def make_key(text: str, model_name: str, dimensions: int) -> str:
+        """
+        Build the cache key from the normalized text, the embedding model name and the vector dimensions.
+        """
+        digest = hashlib.sha256()
+        for part in (EmbeddingCache.normalize_text(text).encode("utf-8"), model_name.encode("utf-8"), str(dimensions).encode("utf-8")):
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Return the cached vectors of the given keys; keys that are not cached are missing from the result.
+        """
+        return {key: array.array("f", vector).tolist() for key, vector in self._store.get_many(keys).items()}
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        """
+        Store (key, vector) pairs and evict old entries if over budget.
+        """
+        self._store.put_many([(key, array.array("f", vector).tobytes()) for key, vector in items])
+
+    def put(self, key: str, vector: List[float]):
+        self.put_many([(key, vector)])
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+    def close(self):
+        self._store.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    The process-wide embedding cache in EMBEDDING_CACHE_DIRECTORY, or None if that variable is not set.
+    """
+    global _default_cache
+    cache_directory = os.getenv("EMBEDDING_CACHE_DIRECTORY")
+    if not cache_directory:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(cache_directory, max_size_mb=int(os.getenv("EMBEDDING_CACHE_MAX_SIZE_MB", "2048")))
+        return _default_cache
@@ -0,0 +1,102 @@
+import re
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+_TERM_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word terms of a text; single characters are dropped."""
+    return [term for term in _TERM_PATTERN.findall(text.lower()) if len(term) > 1]
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over named texts (e.g. document appendices), used to shortlist documents locally.
+
+    The index is updated incrementally: adding, replacing or removing a text only touches that text's
+    terms, and a search only visits the postings of the query terms, so its cost depends on how many
+    documents share the query terms rather than on the size of the corpus.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._term_counts: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._versions: Dict[str, Hashable] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._term_counts)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._term_counts
+
+    def names(self) -> Set[str]:
+        with self._lock:
+            return set(self._term_counts)
+
+    def version(self, name: str) -> Optional[Hashable]:
+        """The version the text of name was added with, so that callers can tell whether it has changed."""
+        return self._versions.get(name)
+
+    def add(self, name: str, text: str, version: Optional[Hashable] = None):
+        """
+        Index text under name, replacing the text previously indexed under it.
+        """
+        term_counts = Counter(tokenize(text))
+        with self._lock:
+            self._remove(name)
+            for term, count in term_counts.items():
+                self._postings.setdefault(term, {})[name] = count
+            self._term_counts[name] = term_counts
+            self._lengths[name] = sum(term_counts.values())
+            self._versions[name] = version
+            self._total_length += self._lengths[name]
+
+    def remove(self, name: str):
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name: str):
+        term_counts = self._term_counts.pop(name, None)
+        if term_counts is None:
+            return
+        for term in term_counts:
+            postings = self._postings[term]
+            del postings[name]
+            if not postings:
+                del self._postings[term]
+        self._versions.pop(name, None)
+        self._total_length -= self._lengths.pop(name)
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Return (name, score) pairs of the texts matching any query term, best first, at most top_k of them.
+        """
+        with self._lock:
+            document_count = len(self._term_counts)
+            if not document_count:
+                return []
+            average_length = self._total_length / document_count or 1.0
+
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for name, count in postings.items():
+                    length_norm = 1 - self.b + self.b * self._lengths[name] / average_length
+                    scores[name] = scores.get(name, 0.0) + idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+
+        if top_k is not None:
+            return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,8 +1,12 @@
 import os
+import asyncio
+import threading
+import weakref
+import httpx
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List, Literal, Type, Union
 from pathlib import Path
-from openai import AzureOpenAI, OpenAI
+from openai import AzureOpenAI, OpenAI, AsyncAzureOpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -86,6 +90,45 @@ openai_embedding_model_info = {
 
 
 
+class TokenUsage(BaseModel):
+    """
+    Token usage accumulated over one or more LLM calls.
+    """
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+    def add(self, usage) -> "TokenUsage":
+        """
+        Accumulate either the `usage` block of an OpenAI response or another TokenUsage.
+        """
+        if isinstance(usage, TokenUsage):
+            self.llm_calls += usage.llm_calls
+        else:
+            self.llm_calls += 1
+
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            self.total_tokens += getattr(usage, "total_tokens", 0) or 0
+        return self
+
+
+class DeploymentInfo(BaseModel):
+    """
+    One deployment of a model, as a member of a pool of deployments routed by utils.deployment_router.
+    """
+    provider: Literal["azure", "openai"] = "azure"
+    endpoint: str = ""
+    key: str = ""
+    model: str = ""
+    api_version: str = "2024-12-01-preview"
+    weight: float = 1.0
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+
 class MulitmodalProcessingModelInfo(BaseModel):
     """
     Information about the multimodal model name.
@@ -97,7 +140,12 @@ class MulitmodalProcessingModelInfo(BaseModel):
     key: str = ""
     model: str = ""
     api_version: str = "2024-12-01-preview"
+    requests_per_minute: Optional[int] = None  # Deployment quota, enforced by utils.rate_limiter
+    tokens_per_minute: Optional[int] = None
+    deployments: List[DeploymentInfo] = []  # If set, calls are spread over these deployments instead
+    hedge_after_seconds: Optional[float] = None  # Duplicate routed calls still running after this long
     client: Union[AzureOpenAI, OpenAI] = None
+    async_client: Union[AsyncAzureOpenAI, AsyncOpenAI] = None
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -113,7 +161,12 @@ class TextProcessingModelnfo(BaseModel):
     key: str = ""
     model: str = ""
     api_version: str = "2024-12-01-preview"
+    requests_per_minute: Optional[int] = None  # Deployment quota, enforced by utils.rate_limiter
+    tokens_per_minute: Optional[int] = None
+    deployments: List[DeploymentInfo] = []  # If set, calls are spread over these deployments instead
+    hedge_after_seconds: Optional[float] = None  # Duplicate routed calls still running after this long
     client: Union[AzureOpenAI, OpenAI] = None
+    async_client: Union[AsyncAzureOpenAI, AsyncOpenAI] = None
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -130,15 +183,16 @@ class EmbeddingModelnfo(BaseModel):
     model: str = ""
     api_version: str = "2024-12-01-preview"
     client: Union[AzureOpenAI, OpenAI] = None
+    async_client: Union[AsyncAzureOpenAI, AsyncOpenAI] = None
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
 
 
-def instantiate_model(model_info: Union[MulitmodalProcessingModelInfo, 
-                                   TextProcessingModelnfo, 
-                                   EmbeddingModelnfo]):
+def resolve_model_info(model_info: Union[MulitmodalProcessingModelInfo, 
+                                    TextProcessingModelnfo, 
+                                    EmbeddingModelnfo]):
      
     if model_info.model_name == "gpt-4o":
         model_info.endpoint = get_azure_endpoint(azure_gpt_4o_model_info["RESOURCE"])
@@ -176,14 +230,116 @@ def instantiate_model(model_info: Union[MulitmodalProcessingModelInfo,
         model_info.model = azure_large_embedding_model_info["MODEL"]
         model_info.api_version = AZURE_OPENAI_API_VERSION
 
-    if model_info.provider == "azure":
-        model_info.client = AzureOpenAI(azure_endpoint=model_info.endpoint, 
-                                        api_key=model_info.key, 
-                                        api_version=model_info.api_version)
-    else:
-        model_info.client = OpenAI(api_key=model_info.key)
+    return model_info
+
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 100))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60))
+
+_client_pool = {}
+# Async clients hold connections bound to the event loop they were used on, so they are pooled per loop
+_async_client_pool = weakref.WeakKeyDictionary()
+_client_pool_lock = threading.Lock()
+
+
+def configure_client_pool(max_connections: Optional[int] = None, 
+                          max_keepalive_connections: Optional[int] = None, 
+                          keepalive_expiry: Optional[float] = None):
+    """
+    Tune the HTTP connection limits of the pooled clients. Applies to clients created afterwards.
+    """
+    global OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS, OPENAI_KEEPALIVE_EXPIRY
+    if max_connections is not None: OPENAI_MAX_CONNECTIONS = max_connections
+    if max_keepalive_connections is not None: OPENAI_MAX_KEEPALIVE_CONNECTIONS = max_keepalive_connections
+    if keepalive_expiry is not None: OPENAI_KEEPALIVE_EXPIRY = keepalive_expiry
+
+
+def _client_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, 
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS, 
+                        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY)
+
+
+def get_pooled_client(provider: str, endpoint: str, key: str, api_version: str) -> Union[AzureOpenAI, OpenAI]:
+    """
+    Return the process-wide client for this endpoint/key/api_version, creating it on first use,
+    so that all helpers share its warm keep-alive connections instead of each opening their own.
+    """
+    pool_key = (provider, endpoint, key, api_version)
+    with _client_pool_lock:
+        client = _client_pool.get(pool_key)
+        if client is None:
+            client = _create_client(provider, endpoint, key, api_version)
+            _client_pool[pool_key] = client
+        return client
+
+
+def _create_client(provider: str, endpoint: str, key: str, api_version: str) -> Union[AzureOpenAI, OpenAI]:
+    http_client = DefaultHttpxClient(limits=_client_limits())
+    if provider == "azure":
+        return AzureOpenAI(azure_endpoint=endpoint, 
+                           api_key=key, 
+                           api_version=api_version,
+                           max_retries=0,  # 429s are retried by utils.rate_limiter
+                           http_client=http_client)
+    return OpenAI(api_key=key, max_retries=0, http_client=http_client)
+
+
+def get_pooled_async_client(provider: str, endpoint: str, key: str, api_version: str) -> Union[AsyncAzureOpenAI, AsyncOpenAI]:
+    """
+    Async counterpart of get_pooled_client, pooled per running event loop.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Not called from an event loop, so there is no loop to pool the client for
+        return _create_async_client(provider, endpoint, key, api_version)
+
+    pool_key = (provider, endpoint, key, api_version)
+    with _client_pool_lock:
+        loop_clients = _async_client_pool.setdefault(loop, {})
+        client = loop_clients.get(pool_key)
+        if client is None:
+            client = _create_async_client(provider, endpoint, key, api_version)
+            loop_clients[pool_key] = client
+        return client
+
+
+def _create_async_client(provider: str, endpoint: str, key: str, api_version: str) -> Union[AsyncAzureOpenAI, AsyncOpenAI]:
+    http_client = DefaultAsyncHttpxClient(limits=_client_limits())
+    if provider == "azure":
+        return AsyncAzureOpenAI(azure_endpoint=endpoint, 
+                                api_key=key, 
+                                api_version=api_version,
+                                max_retries=0,  # 429s are retried by utils.rate_limiter
+                                http_client=http_client)
+    return AsyncOpenAI(api_key=key, max_retries=0, http_client=http_client)
+
+
+def instantiate_model(model_info: Union[MulitmodalProcessingModelInfo, 
+                                   TextProcessingModelnfo, 
+                                   EmbeddingModelnfo]):
+
+    resolve_model_info(model_info)
 
+    model_info.client = get_pooled_client(model_info.provider, model_info.endpoint, model_info.key, model_info.api_version)
 
     # console.print("Requested", model_info)
     
     return model_info
+
+
+
+def instantiate_async_model(model_info: Union[MulitmodalProcessingModelInfo, 
+                                         TextProcessingModelnfo, 
+                                         EmbeddingModelnfo]):
+    """
+    Same as instantiate_model, but sets up an AsyncAzureOpenAI / AsyncOpenAI client in
+    model_info.async_client, shared by all async calls made with this model info.
+    """
+    resolve_model_info(model_info)
+
+    model_info.async_client = get_pooled_async_client(model_info.provider, model_info.endpoint, model_info.key, model_info.api_version)
+
+    return model_info
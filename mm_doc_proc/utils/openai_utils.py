@@ -4,7 +4,6 @@ import logging
 import openai
 from openai import AzureOpenAI, OpenAI
 import base64
-import tiktoken
 import requests
 import json
 from typing import List
@@ -25,23 +24,21 @@ from mm_doc_proc.utils.text_utils import recover_json
 from mm_doc_proc.multimodal_processing_pipeline.data_models import *
 from mm_doc_proc.utils.openai_data_models import *
 from mm_doc_proc.utils.file_utils import convert_png_to_jpg, get_image_base64
+from mm_doc_proc.utils.rate_limiter import rate_limited_call, rate_limited_call_async, configure_rate_limits
+from mm_doc_proc.utils.deployment_router import get_router
+from mm_doc_proc.utils.telemetry import llm_stage
+from mm_doc_proc.utils.tokenizer import get_encoding, count_tokens, encode_batch
+from mm_doc_proc.utils.embedding_cache import EmbeddingCache, get_default_embedding_cache
+from multiprocessing.dummy import Pool as ThreadPool
 
 
 
 def get_encoder(model = "gpt-4o"):
-    if model == "gpt-4o":
-        return tiktoken.get_encoding("o200k_base")       
-    if model == "o1":
-        return tiktoken.get_encoding("o200k_base")       
-    if model == "mini":
-        return tiktoken.get_encoding("o200k_base")       
-    else:
-        return tiktoken.get_encoding("o200k_base")
+    return get_encoding(model)
 
 
 def get_token_count(text, model = "gpt-4o"):
-    enc = get_encoder(model)
-    return len(enc.encode(text))
+    return count_tokens(text, model)
 
 
 def prepare_image_messages(imgs):
@@ -49,6 +46,16 @@ def prepare_image_messages(imgs):
     img_msgs = []
 
     for image_path_or_url in img_arr:
+        if isinstance(image_path_or_url, bytes):
+            # In-memory JPEG, e.g. a page rendered by the ingestion pipeline
+            img_msgs.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64.b64encode(image_path_or_url).decode('ascii')}"
+                }
+            })
+            continue
+
         image_path_or_url = os.path.abspath(image_path_or_url)
         try:
             if os.path.splitext(image_path_or_url)[1] == ".png":
@@ -68,87 +75,384 @@ def prepare_image_messages(imgs):
 
 
 
-def get_embeddings(text : str, model_info: EmbeddingModelnfo = EmbeddingModelnfo()):
+# Per-request limits of the embeddings API
+EMBEDDING_MAX_BATCH_INPUTS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 300000
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+EMBEDDING_CONCURRENT_REQUESTS = 8
+
+
+def get_embeddings(text : str, model_info: EmbeddingModelnfo = EmbeddingModelnfo(), cache: Optional[EmbeddingCache] = None):
+    return get_embeddings_batch([text], model_info, cache=cache)[0]
+
+
+def pack_embedding_batches(
+    token_counts: List[int],
+    max_batch_inputs: int = EMBEDDING_MAX_BATCH_INPUTS,
+    max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS
+) -> List[List[int]]:
+    """
+    Group input indices, in order, into batches of at most max_batch_inputs inputs and max_batch_tokens tokens.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for i, tokens in enumerate(token_counts):
+        if batch and (len(batch) >= max_batch_inputs or batch_tokens + tokens > max_batch_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def get_embeddings_batch(
+    texts: List[str],
+    model_info: EmbeddingModelnfo = EmbeddingModelnfo(),
+    cache: Optional[EmbeddingCache] = None,
+    max_batch_inputs: int = EMBEDDING_MAX_BATCH_INPUTS,
+    max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+    max_concurrent_requests: int = EMBEDDING_CONCURRENT_REQUESTS
+) -> List[List[float]]:
+    """
+    Embed many texts with as few requests as possible: the inputs are packed into requests bounded by
+    the API's input count and token limits, the requests run concurrently through the deployment's
+    rate limiter, and the vectors are returned in the order of texts.
+
+    Vectors found in the embedding cache (cache, or by default the one in EMBEDDING_CACHE_DIRECTORY
+    if set) are reused, and only the missing texts are embedded, each distinct text once.
+    Inputs longer than the model's context are truncated to EMBEDDING_MAX_INPUT_TOKENS tokens.
+    """
+    if cache is None:
+        cache = get_default_embedding_cache()
+    if cache is None or not texts:
+        return _embed_texts(texts, model_info, max_batch_inputs, max_batch_tokens, max_concurrent_requests)
+
+    keys = [cache.make_key(text, model_info.model_name, model_info.dimensions) for text in texts]
+    vectors = [None] * len(texts)
+    cached_vectors = cache.get_many(keys)
+    missing = {}
+    for i, key in enumerate(keys):
+        if key in cached_vectors:
+            vectors[i] = cached_vectors[key]
+        else:
+            missing.setdefault(key, []).append(i)
+
+    if missing:
+        new_vectors = _embed_texts([texts[positions[0]] for positions in missing.values()],
+                                   model_info, max_batch_inputs, max_batch_tokens, max_concurrent_requests)
+        for positions, vector in zip(missing.values(), new_vectors):
+            for i in positions:
+                vectors[i] = vector
+        cache.put_many(list(zip(missing.keys(), new_vectors)))
+    return vectors
+
+
+def _embed_texts(
+    texts: List[str],
+    model_info: EmbeddingModelnfo,
+    max_batch_inputs: int,
+    max_batch_tokens: int,
+    max_concurrent_requests: int
+) -> List[List[float]]:
+    if not texts:
+        return []
     if model_info.client is None: model_info = instantiate_model(model_info)
-    return model_info.client.embeddings.create(input=[text], model=model_info.model_name).data[0].embedding
+    configure_rate_limits(model_info.client, model_info)
+    model = model_info.model or model_info.model_name
+
+    encoder = get_encoding(model_info.model_name)
+    inputs, token_counts = [], []
+    for text, tokens in zip(texts, encode_batch(texts, model_info.model_name)):
+        if len(tokens) > EMBEDDING_MAX_INPUT_TOKENS:
+            tokens = tokens[:EMBEDDING_MAX_INPUT_TOKENS]
+            text = encoder.decode(tokens)
+        inputs.append(text)
+        token_counts.append(len(tokens))
+
+    def embed_batch(batch: List[int]) -> List[List[float]]:
+        batch_inputs = [inputs[i] for i in batch]
+        # Set in the worker thread, which does not inherit the caller's context variables
+        with llm_stage("embeddings"):
+            response = rate_limited_call(
+                model_info.client, model, None,
+                lambda: model_info.client.embeddings.create(input=batch_inputs, model=model),
+                estimated_tokens=sum(token_counts[i] for i in batch)
+            )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    batches = pack_embedding_batches(token_counts, max_batch_inputs, max_batch_tokens)
+    if len(batches) == 1:
+        batch_vectors = [embed_batch(batches[0])]
+    else:
+        with ThreadPool(min(max_concurrent_requests, len(batches))) as pool:
+            batch_vectors = pool.map(embed_batch, batches)
+
+    vectors = [None] * len(texts)
+    for batch, embeddings in zip(batches, batch_vectors):
+        for i, embedding in zip(batch, embeddings):
+            vectors[i] = embedding
+    return vectors
 
 
 
-def call_llm(prompt_or_messages: str, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], temperature = 0.2):
+def record_usage(usage: Optional[TokenUsage], response):
+    if usage is not None:
+        usage.add(getattr(response, "usage", None))
+
+
+
+def build_messages(prompt_or_messages):
     if isinstance(prompt_or_messages, str):
         messages = []
         messages.append({"role": "user", "content": "You are a helpful assistant, who helps the user with their query."})     
         messages.append({"role": "user", "content": prompt_or_messages})     
     else:
         messages = prompt_or_messages
+    return messages
+
+
+def build_structured_messages(prompt: str, imgs=[]):
+    content = [{"type": "text", "text": prompt}]
+    content = content + prepare_image_messages(imgs)
+    messages = [
+        {"role": "user", "content": "You are a helpful assistant that processes images to generate structured outputs."},
+        {"role": "user", "content": content},
+    ]
+    return messages
+
+
+def _strict_json_schema(schema):
+    """
+    Make a JSON schema valid for strict structured outputs: every object closed to additional
+    properties and with all of its properties required, and no defaults.
+    """
+    if isinstance(schema, list):
+        return [_strict_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+
+    strict_schema = {}
+    for key, value in schema.items():
+        if key == "default":
+            continue
+        if key in ("properties", "$defs"):
+            # Their keys are field and definition names, not schema keywords
+            strict_schema[key] = {name: _strict_json_schema(field) for name, field in value.items()}
+        else:
+            strict_schema[key] = _strict_json_schema(value)
+    schema = strict_schema
+    if "properties" in schema:
+        schema["required"] = list(schema["properties"])
+    if schema.get("type") == "object":
+        schema["additionalProperties"] = False
+    return schema
+
+
+def response_format_param(response_format) -> dict:
+    """
+    The json_schema response_format of a Pydantic model, as .parse() requests it.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.__name__,
+            "schema": _strict_json_schema(response_format.model_json_schema()),
+            "strict": True
+        }
+    }
+
+
+def chat_request_body(messages, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], temperature = 0.2, response_format = None):
+    """
+    The body of the chat completions request that call_llm / call_llm_structured_outputs would send,
+    e.g. for a line of a batch file. Structured outputs are requested with the same JSON schema as .parse().
+    """
+    body = {"model": model_info.model, "messages": messages}
+    if model_info.model_name == "o1":
+        body["reasoning_effort"] = model_info.reasoning_efforts
+    elif model_info.model_name != "o1-mini":
+        body["temperature"] = temperature
+    if response_format is not None:
+        body["response_format"] = response_format_param(response_format)
+    return body
+
+
+
+def call_llm(prompt_or_messages: str, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], temperature = 0.2, usage: Optional[TokenUsage] = None):
+    messages = build_messages(prompt_or_messages)
+
+    def dispatch(client, model):
+        if model_info.model_name == "gpt-4o":
+            return call_4o(messages, client, model, temperature, usage=usage)
+        elif model_info.model_name == "o1":
+            return call_o1(messages, client, model, model_info.reasoning_efforts, usage=usage)
+        elif model_info.model_name == "o1-mini":
+            return call_o1_mini(messages, client, model, usage=usage)
+        else:
+            return call_4o(messages, client, model, temperature, usage=usage)
+
+    if model_info.deployments:
+        return get_router(model_info.deployments, model_info.hedge_after_seconds).call(dispatch)
 
     if model_info.client is None: model_info = instantiate_model(model_info)
+    configure_rate_limits(model_info.client, model_info)
 
-    if model_info.model_name == "gpt-4o":
-        return call_4o(messages, model_info.client, model_info.model, temperature)
-    elif model_info.model_name == "o1":
-        return call_o1(messages, model_info.client, model_info.model, model_info.reasoning_efforts)
-    elif model_info.model_name == "o1-mini":
-        return call_o1_mini(messages, model_info.client, model_info.model)
-    else:
-        return call_4o(messages, model_info.client, model_info.model, temperature)
+    return dispatch(model_info.client, model_info.model)
 
 
 
-def call_4o(messages, client, model, temperature = 0.2):
+def call_4o(messages, client, model, temperature = 0.2, usage: Optional[TokenUsage] = None):
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
-    result = client.chat.completions.create(model = model, temperature = temperature, messages = messages)
+    result = rate_limited_call(client, model, messages, lambda: client.chat.completions.create(model = model, temperature = temperature, messages = messages))
+    record_usage(usage, result)
     return result.choices[0].message.content
       
 
-def call_o1(messages,  client, model, reasoning_effort ="medium"): 
+def call_o1(messages,  client, model, reasoning_effort ="medium", usage: Optional[TokenUsage] = None): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
-    response = client.chat.completions.create(model=model, messages=messages, reasoning_effort=reasoning_effort)
+    response = rate_limited_call(client, model, messages, lambda: client.chat.completions.create(model=model, messages=messages, reasoning_effort=reasoning_effort))
+    record_usage(usage, response)
     return response.model_dump()['choices'][0]['message']['content']
 
 
-def call_o1_mini(messages,  client, model): 
+def call_o1_mini(messages,  client, model, usage: Optional[TokenUsage] = None): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
-    response = client.chat.completions.create(model=model, messages=messages)
+    response = rate_limited_call(client, model, messages, lambda: client.chat.completions.create(model=model, messages=messages))
+    record_usage(usage, response)
     return response.model_dump()['choices'][0]['message']['content']
        
 
 
-def call_llm_structured_outputs(prompt: str, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], response_format, imgs=[]):
-    content = [{"type": "text", "text": prompt}]
-    content = content + prepare_image_messages(imgs)
-    messages = [
-        {"role": "user", "content": "You are a helpful assistant that processes images to generate structured outputs."},
-        {"role": "user", "content": content},
-    ]
+def call_llm_structured_outputs(prompt: str, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], response_format, imgs=[], usage: Optional[TokenUsage] = None):
+    messages = build_structured_messages(prompt, imgs)
+
+    def dispatch(client, model):
+        if model_info.model_name == "gpt-4o":
+            return call_llm_structured_4o(messages, client, model, response_format, usage=usage)
+        elif model_info.model_name == "o1":
+            return call_llm_structured_o1(messages, client, model, response_format, model_info.reasoning_efforts, usage=usage)
+        elif model_info.model_name == "o1-mini":
+            return call_llm_structured_o1_mini(messages, client, model, response_format, usage=usage)
+        else:
+            return call_llm_structured_4o(messages, client, model, response_format, usage=usage)
+
+    if model_info.deployments:
+        return get_router(model_info.deployments, model_info.hedge_after_seconds).call(dispatch)
 
     if model_info.client is None: model_info = instantiate_model(model_info)
+    configure_rate_limits(model_info.client, model_info)
 
-    if model_info.model_name == "gpt-4o":
-        return call_llm_structured_4o(messages, model_info.client, model_info.model, response_format)
-    elif model_info.model_name == "o1":
-        return call_llm_structured_o1(messages, model_info.client, model_info.model, response_format, model_info.reasoning_efforts)
-    elif model_info.model_name == "o1-mini":
-        return call_llm_structured_o1_mini(messages, model_info.client, model_info.model, response_format)
-    else:
-        return call_llm_structured_4o(messages, model_info.client, model_info.model, response_format)
+    return dispatch(model_info.client, model_info.model)
 
 
 
-def call_llm_structured_4o(messages, client, model, response_format):
+def call_llm_structured_4o(messages, client, model, response_format, usage: Optional[TokenUsage] = None):
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
-    completion = client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format)
+    completion = rate_limited_call(client, model, messages, lambda: client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format))
+    record_usage(usage, completion)
     return completion.choices[0].message.parsed
 
 
-def call_llm_structured_o1(messages, client, model, response_format, reasoning_effort ="medium"): 
+def call_llm_structured_o1(messages, client, model, response_format, reasoning_effort ="medium", usage: Optional[TokenUsage] = None): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
-    response = client.beta.chat.completions.parse(model=model, messages=messages, reasoning_effort=reasoning_effort, response_format=response_format)
+    response = rate_limited_call(client, model, messages, lambda: client.beta.chat.completions.parse(model=model, messages=messages, reasoning_effort=reasoning_effort, response_format=response_format))
+    record_usage(usage, response)
     return response.choices[0].message.parsed
 
  
-def call_llm_structured_o1_mini(messages, client, model, response_format): 
+def call_llm_structured_o1_mini(messages, client, model, response_format, usage: Optional[TokenUsage] = None): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
-    response = client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format)
+    response = rate_limited_call(client, model, messages, lambda: client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format))
+    record_usage(usage, response)
+    return response.choices[0].message.parsed
+
+
+
+###############################################################################
+# Async variants - share one AsyncAzureOpenAI / AsyncOpenAI client per model info
+###############################################################################
+
+
+async def call_llm_async(prompt_or_messages: str, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], temperature = 0.2, usage: Optional[TokenUsage] = None):
+    messages = build_messages(prompt_or_messages)
+
+    def dispatch(client, model):
+        if model_info.model_name == "gpt-4o":
+            return call_4o_async(messages, client, model, temperature, usage=usage)
+        elif model_info.model_name == "o1":
+            return call_o1_async(messages, client, model, model_info.reasoning_efforts, usage=usage)
+        elif model_info.model_name == "o1-mini":
+            return call_o1_mini_async(messages, client, model, usage=usage)
+        else:
+            return call_4o_async(messages, client, model, temperature, usage=usage)
+
+    if model_info.deployments:
+        return await get_router(model_info.deployments, model_info.hedge_after_seconds).call_async(dispatch)
+
+    if model_info.async_client is None: model_info = instantiate_async_model(model_info)
+    configure_rate_limits(model_info.async_client, model_info)
+
+    return await dispatch(model_info.async_client, model_info.model)
+
+
+
+async def call_4o_async(messages, client, model, temperature = 0.2, usage: Optional[TokenUsage] = None):
+    result = await rate_limited_call_async(client, model, messages, lambda: client.chat.completions.create(model = model, temperature = temperature, messages = messages))
+    record_usage(usage, result)
+    return result.choices[0].message.content
+
+
+async def call_o1_async(messages, client, model, reasoning_effort ="medium", usage: Optional[TokenUsage] = None):
+    response = await rate_limited_call_async(client, model, messages, lambda: client.chat.completions.create(model=model, messages=messages, reasoning_effort=reasoning_effort))
+    record_usage(usage, response)
+    return response.model_dump()['choices'][0]['message']['content']
+
+
+async def call_o1_mini_async(messages, client, model, usage: Optional[TokenUsage] = None):
+    response = await rate_limited_call_async(client, model, messages, lambda: client.chat.completions.create(model=model, messages=messages))
+    record_usage(usage, response)
+    return response.model_dump()['choices'][0]['message']['content']
+
+
+
+async def call_llm_structured_outputs_async(prompt: str, model_info: Union[MulitmodalProcessingModelInfo, TextProcessingModelnfo], response_format, imgs=[], usage: Optional[TokenUsage] = None):
+    messages = build_structured_messages(prompt, imgs)
+
+    def dispatch(client, model):
+        if model_info.model_name == "gpt-4o":
+            return call_llm_structured_4o_async(messages, client, model, response_format, usage=usage)
+        elif model_info.model_name == "o1":
+            return call_llm_structured_o1_async(messages, client, model, response_format, model_info.reasoning_efforts, usage=usage)
+        elif model_info.model_name == "o1-mini":
+            return call_llm_structured_o1_mini_async(messages, client, model, response_format, usage=usage)
+        else:
+            return call_llm_structured_4o_async(messages, client, model, response_format, usage=usage)
+
+    if model_info.deployments:
+        return await get_router(model_info.deployments, model_info.hedge_after_seconds).call_async(dispatch)
+
+    if model_info.async_client is None: model_info = instantiate_async_model(model_info)
+    configure_rate_limits(model_info.async_client, model_info)
+
+    return await dispatch(model_info.async_client, model_info.model)
+
+
+
+async def call_llm_structured_4o_async(messages, client, model, response_format, usage: Optional[TokenUsage] = None):
+    completion = await rate_limited_call_async(client, model, messages, lambda: client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format))
+    record_usage(usage, completion)
+    return completion.choices[0].message.parsed
+
+
+async def call_llm_structured_o1_async(messages, client, model, response_format, reasoning_effort ="medium", usage: Optional[TokenUsage] = None):
+    response = await rate_limited_call_async(client, model, messages, lambda: client.beta.chat.completions.parse(model=model, messages=messages, reasoning_effort=reasoning_effort, response_format=response_format))
+    record_usage(usage, response)
     return response.choices[0].message.parsed
 
+
+async def call_llm_structured_o1_mini_async(messages, client, model, response_format, usage: Optional[TokenUsage] = None):
+    response = await rate_limited_call_async(client, model, messages, lambda: client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format))
+    record_usage(usage, response)
+    return response.choices[0].message.parsed
@@ -0,0 +1,130 @@
+import os
+import string
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+
+
+PACKAGE_DIRECTORY = Path(__file__).resolve().parent.parent
+
+PROMPT_DIRECTORIES = [
+    PACKAGE_DIRECTORY / "multimodal_processing_pipeline" / "prompts",
+    PACKAGE_DIRECTORY / "search" / "search_prompts",
+]
+
+# The str.format placeholders each templated prompt must have; prompts not listed are sent as-is
+PROMPT_PLACEHOLDERS = {
+    "process_extracted_text_prompt.txt": {"text"},
+    "document_condensation_prompt.txt": {"document"},
+    "table_of_contents_prompt.txt": {"document"},
+    "document_routinization_prompt.txt": {"document", "TOOLS"},
+    "search_expansion_prompt.txt": {"query"},
+}
+
+
+class _Prompt:
+    def __init__(self, path: Path, text: str, mtime: float):
+        self.path = path
+        self.text = text
+        self.mtime = mtime
+
+
+class PromptRegistry:
+    """
+    Loads and validates every prompt file of the given directories once, so that looking up a
+    prompt is a dictionary access instead of a search of the working tree and a file read.
+
+    Prompts are looked up by file name, which must be unique across the directories. With
+    hot_reload on, a lookup re-reads a prompt whose file modification time has changed.
+    """
+
+    def __init__(self, directories: List[Union[str, os.PathLike]], hot_reload: bool = False):
+        self.directories = [Path(directory) for directory in directories]
+        self.hot_reload = hot_reload
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, _Prompt] = {}
+        self.load()
+
+    @staticmethod
+    def _read(path: Path) -> _Prompt:
+        mtime = path.stat().st_mtime
+        text = path.read_text(encoding="utf-8")
+        PromptRegistry.validate(path.name, text)
+        return _Prompt(path, text, mtime)
+
+    @staticmethod
+    def placeholders(text: str) -> Set[str]:
+        return {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+
+    @staticmethod
+    def validate(prompt_name: str, text: str):
+        """
+        Check that a prompt is not empty and, for templated prompts, that its placeholders are the ones its caller fills in.
+
+        Other prompts are sent as-is, so they may contain literal braces (e.g. JSON examples).
+        """
+        if not text.strip():
+            raise ValueError(f"Prompt {prompt_name} is empty")
+
+        expected = PROMPT_PLACEHOLDERS.get(prompt_name)
+        if expected is None:
+            return
+        try:
+            placeholders = PromptRegistry.placeholders(text)
+        except ValueError as e:
+            raise ValueError(f"Prompt {prompt_name} has malformed placeholders: {e}")
+        if placeholders != expected:
+            raise ValueError(f"Prompt {prompt_name} has placeholders {sorted(placeholders)}, expected {sorted(expected)}")
+
+    def load(self):
+        """
+        (Re)load all prompts from disk.
+        """
+        prompts = {}
+        for directory in self.directories:
+            for path in sorted(directory.glob("*.txt")):
+                if path.name in prompts:
+                    raise ValueError(f"Prompt {path.name} is defined in both {prompts[path.name].path.parent} and {directory}")
+                prompts[path.name] = self._read(path)
+
+        with self._lock:
+            self._prompts = prompts
+
+    def get(self, prompt_name: str) -> str:
+        """
+        Return the text of a prompt by file name, e.g. 'image_description_prompt.txt'.
+        """
+        prompt = self._prompts.get(prompt_name)
+        if prompt is None:
+            raise KeyError(f"Unknown prompt {prompt_name}, available prompts: {sorted(self._prompts)}")
+
+        if self.hot_reload and prompt.path.stat().st_mtime != prompt.mtime:
+            prompt = self._read(prompt.path)
+            with self._lock:
+                self._prompts[prompt_name] = prompt
+        return prompt.text
+
+    def names(self) -> List[str]:
+        return sorted(self._prompts)
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the names and texts of all prompts, which changes whenever any prompt does.
+        """
+        digest = hashlib.sha256()
+        for prompt_name in self.names():
+            for part in (prompt_name.encode("utf-8"), self.get(prompt_name).encode("utf-8")):
+                digest.update(len(part).to_bytes(8, "little"))
+                digest.update(part)
+        return digest.hexdigest()
+
+
+prompt_registry = PromptRegistry(
+    PROMPT_DIRECTORIES,
+    hot_reload=os.getenv("PROMPT_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+)
+
+
+def get_prompt(prompt_name: str) -> str:
+    return prompt_registry.get(prompt_name)
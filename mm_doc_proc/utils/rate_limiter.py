@@ -0,0 +1,408 @@
+import time
+import asyncio
+import threading
+import email.utils
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import openai
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    wait_random_exponential
+)
+
+from mm_doc_proc.utils.telemetry import record_llm_call
+from mm_doc_proc.utils.tokenizer import count_tokens
+
+from rich.console import Console
+console = Console()
+
+
+# Roughly what a high-detail page image costs; prompts are only estimated before sending
+# and the token bucket is corrected with the real usage once the response arrives.
+IMAGE_TOKEN_ESTIMATE = 1105
+COMPLETION_TOKEN_ESTIMATE = 1000
+MAX_RATE_LIMITED_ATTEMPTS = 6
+
+# The clients are created with max_retries=0 so that 429s reach the shared limiter;
+# the transient errors the OpenAI SDK would have retried are retried here instead.
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.InternalServerError
+)
+
+# Set by utils.deployment_router while it tries a deployment: errors are raised straight
+# away so that the router can fail over, instead of being retried on the same deployment
+single_attempt = contextvars.ContextVar("single_attempt", default=False)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity_per_minute / 60 per second.
+
+    reserve() deducts the amount immediately, letting the balance go negative, and returns how
+    long the caller has to wait for the debt to be repaid. Concurrent callers therefore queue up
+    behind each other at exactly the refill rate, instead of all waking up together.
+    """
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = capacity_per_minute
+        self.rate = capacity_per_minute / 60.0
+        self.balance = capacity_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single request larger than the whole bucket must still get through eventually
+        self.balance -= min(amount, self.capacity)
+        return 0.0 if self.balance >= 0 else -self.balance / self.rate
+
+    def adjust(self, amount: float, now: float):
+        """Give back (positive) or charge (negative) tokens after the fact."""
+        self._refill(now)
+        self.balance = min(self.capacity, self.balance + amount)
+
+
+class DeploymentRateLimiter:
+    """
+    Request- and token-rate governor for one deployment, shared by every call to it.
+
+    Limits are applied at headroom (90% by default) of the configured quota, so throughput stays
+    just under it instead of alternating between bursts and 429s. A 429 with Retry-After pauses
+    all callers of the deployment, not only the one that received it.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None, headroom: float = 0.9):
+        self._lock = threading.Lock()
+        self.headroom = headroom
+        self.request_bucket = None
+        self.token_bucket = None
+        self.paused_until = 0.0
+        self.configure(requests_per_minute, tokens_per_minute)
+
+    def configure(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        with self._lock:
+            if requests_per_minute and (self.request_bucket is None or self.request_bucket.capacity != requests_per_minute * self.headroom):
+                self.request_bucket = TokenBucket(requests_per_minute * self.headroom)
+            if tokens_per_minute and (self.token_bucket is None or self.token_bucket.capacity != tokens_per_minute * self.headroom):
+                self.token_bucket = TokenBucket(tokens_per_minute * self.headroom)
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reserve one request and the estimated tokens; returns the number of seconds to wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket is not None:
+                wait = max(wait, self.token_bucket.reserve(tokens, now))
+            return wait
+
+    def acquire(self, tokens: int):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """
+        Correct the token bucket with the tokens the call actually used.
+        """
+        if actual_tokens is None or self.token_bucket is None:
+            return
+        with self._lock:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens, time.monotonic())
+
+    def remaining_fraction(self) -> float:
+        """
+        Fraction of the quota currently available (0 while paused, 1 if no quota is configured).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.paused_until > now:
+                return 0.0
+            fraction = 1.0
+            for bucket in (self.request_bucket, self.token_bucket):
+                if bucket is not None:
+                    bucket._refill(now)
+                    fraction = min(fraction, max(0.0, bucket.balance) / bucket.capacity)
+            return fraction
+
+    def pause(self, seconds: float):
+        """
+        Hold back every caller of this deployment for the given number of seconds (e.g. from Retry-After).
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_rate_limiters: Dict[Tuple[str, str], DeploymentRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(client, model: str) -> DeploymentRateLimiter:
+    """
+    Return the rate limiter of the deployment behind this client and model, creating it on first use.
+    Sync and async clients of the same endpoint share one limiter.
+    """
+    key = (str(getattr(client, "base_url", "")), model)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = DeploymentRateLimiter()
+        return _rate_limiters[key]
+
+
+def configure_rate_limits(client, model_info):
+    """
+    Apply the requests_per_minute / tokens_per_minute quota of a model info to its deployment's limiter.
+    """
+    requests_per_minute = getattr(model_info, "requests_per_minute", None)
+    tokens_per_minute = getattr(model_info, "tokens_per_minute", None)
+    if requests_per_minute or tokens_per_minute:
+        get_rate_limiter(client, model_info.model).configure(requests_per_minute, tokens_per_minute)
+
+
+def estimate_request_tokens(messages, completion_tokens: int = COMPLETION_TOKEN_ESTIMATE) -> int:
+    """
+    Estimate the tokens a chat request will be charged for: the prompt text, a flat cost
+    per image, and the expected completion.
+    """
+    tokens = completion_tokens
+    for message in messages:
+        content = message.get("content", "")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_TOKEN_ESTIMATE
+            else:
+                tokens += count_tokens(part.get("text") or "")
+    return tokens
+
+
+def retry_after_seconds(exception) -> Optional[float]:
+    """
+    Read the retry-after-ms / Retry-After headers of a 429 response, if any.
+    """
+    response = getattr(exception, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+_backoff = wait_random_exponential(multiplier=1, max=60)
+
+
+def wait_retry_after(retry_state) -> float:
+    """
+    tenacity wait strategy: honour Retry-After when the server sends it, else back off exponentially.
+    """
+    seconds = retry_after_seconds(retry_state.outcome.exception())
+    if seconds is not None:
+        return seconds
+    return _backoff(retry_state)
+
+
+def stop_retrying(retry_state) -> bool:
+    """
+    tenacity stop strategy: give up after MAX_RATE_LIMITED_ATTEMPTS, or at once inside a router failover attempt.
+    """
+    return single_attempt.get() or retry_state.attempt_number >= MAX_RATE_LIMITED_ATTEMPTS
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def _on_rate_limited(limiter: DeploymentRateLimiter, exception):
+    seconds = retry_after_seconds(exception)
+    console.print(f"[bold yellow]Rate limited (429), retrying after {seconds if seconds is not None else 'backoff'} s[/bold yellow]")
+    if seconds is not None:
+        limiter.pause(seconds)
+
+
+class _CallTimings:
+    """
+    Queueing delay, network latency and attempts of one rate limited call, for telemetry.
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.queue_seconds = 0.0
+        self.latency_seconds = 0.0
+
+    def record(self, client, model: str, response, outcome: str = "success"):
+        record_llm_call(client, model, response, queue_seconds=self.queue_seconds,
+                        latency_seconds=self.latency_seconds, retries=max(0, self.attempts - 1), outcome=outcome)
+
+
+class _UsageRecordingStream:
+    """
+    A streamed response that corrects the token bucket and records the call once the stream has ended,
+    with the usage of its last chunk (sent when the request sets stream_options={"include_usage": True}).
+    """
+
+    def __init__(self, stream, on_end: Callable[[Any], None]):
+        self._stream = stream
+        self._on_end = on_end
+
+    def __iter__(self):
+        usage_chunk = None
+        try:
+            for chunk in self._stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage_chunk = chunk
+                yield chunk
+        finally:
+            self._on_end(usage_chunk)
+
+    async def __aiter__(self):
+        usage_chunk = None
+        try:
+            async for chunk in self._stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage_chunk = chunk
+                yield chunk
+        finally:
+            self._on_end(usage_chunk)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _is_stream(response) -> bool:
+    return isinstance(response, (openai.Stream, openai.AsyncStream))
+
+
+def _record_stream(limiter: DeploymentRateLimiter, estimated_tokens: int, timings: _CallTimings, client, model: str, stream):
+    # The stream is consumed after the caller's telemetry stage has been left, so record it in the context of the call
+    context = contextvars.copy_context()
+
+    def on_end(usage_chunk):
+        limiter.reconcile(estimated_tokens, _usage_tokens(usage_chunk))
+        context.run(timings.record, client, model, usage_chunk)
+    return _UsageRecordingStream(stream, on_end)
+
+
+def rate_limited_call(client, model: str, messages, call: Callable[[], Any], estimated_tokens: Optional[int] = None) -> Any:
+    """
+    Make an LLM call through the deployment's rate limiter, retrying 429s and transient errors,
+    and record its queueing delay, latency, retries and token usage in the telemetry.
+    Requests that are not chat completions (e.g. embeddings) pass their own estimated_tokens.
+    Streamed responses are recorded when the stream ends, with the usage of its last chunk.
+    """
+    limiter = get_rate_limiter(client, model)
+    if estimated_tokens is None:
+        estimated_tokens = estimate_request_tokens(messages)
+    timings = _CallTimings()
+
+    @retry(retry=retry_if_exception_type(RETRYABLE_ERRORS), wait=wait_retry_after,
+           stop=stop_retrying, reraise=True)
+    def attempt():
+        timings.attempts += 1
+        start = time.perf_counter()
+        limiter.acquire(estimated_tokens)
+        timings.queue_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            response = call()
+        except openai.RateLimitError as e:
+            # A failed request uses no tokens, so give back those reserved for it before the retry reserves them again
+            limiter.reconcile(estimated_tokens, 0)
+            _on_rate_limited(limiter, e)
+            raise
+        except Exception:
+            limiter.reconcile(estimated_tokens, 0)
+            raise
+        finally:
+            timings.latency_seconds = time.perf_counter() - start
+        if not _is_stream(response):
+            limiter.reconcile(estimated_tokens, _usage_tokens(response))
+        return response
+
+    try:
+        response = attempt()
+    except Exception:
+        timings.record(client, model, None, outcome="error")
+        raise
+    if _is_stream(response):
+        return _record_stream(limiter, estimated_tokens, timings, client, model, response)
+    timings.record(client, model, response)
+    return response
+
+
+async def rate_limited_call_async(client, model: str, messages, call: Callable[[], Awaitable[Any]], estimated_tokens: Optional[int] = None) -> Any:
+    """
+    Async version of rate_limited_call.
+    """
+    limiter = get_rate_limiter(client, model)
+    if estimated_tokens is None:
+        estimated_tokens = estimate_request_tokens(messages)
+    timings = _CallTimings()
+
+    @retry(retry=retry_if_exception_type(RETRYABLE_ERRORS), wait=wait_retry_after,
+           stop=stop_retrying, reraise=True)
+    async def attempt():
+        timings.attempts += 1
+        start = time.perf_counter()
+        await limiter.acquire_async(estimated_tokens)
+        timings.queue_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            response = await call()
+        except openai.RateLimitError as e:
+            # A failed request uses no tokens, so give back those reserved for it before the retry reserves them again
+            limiter.reconcile(estimated_tokens, 0)
+            _on_rate_limited(limiter, e)
+            raise
+        except Exception:
+            limiter.reconcile(estimated_tokens, 0)
+            raise
+        finally:
+            timings.latency_seconds = time.perf_counter() - start
+        if not _is_stream(response):
+            limiter.reconcile(estimated_tokens, _usage_tokens(response))
+        return response
+
+    try:
+        response = await attempt()
+    except Exception:
+        timings.record(client, model, None, outcome="error")
+        raise
+    if _is_stream(response):
+        return _record_stream(limiter, estimated_tokens, timings, client, model, response)
+    timings.record(client, model, response)
+    return response
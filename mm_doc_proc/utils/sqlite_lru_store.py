@@ -0,0 +1,123 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+
+# SQLite limits the number of parameters of a statement
+_QUERY_CHUNK_SIZE = 500
+
+Value = Union[str, bytes]
+
+
+class SQLiteLRUStore:
+    """
+    Persistent key-value store in a SQLite file, bounded in size by evicting the least recently used entries first.
+
+    Values are strings or bytes; callers (the LLM result cache, the embedding cache, the document store)
+    serialize their own values. The store is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, os.PathLike],
+        file_name: str,
+        max_size_mb: int = 1024,
+        table: str = "entries",
+        value_column: str = "value"
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, file_name)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        # Table and column names are fixed by the callers, never user input
+        self._table = table
+        self._value_column = value_column
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"key TEXT PRIMARY KEY, {value_column} BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Value]:
+        """
+        Return the stored values of the given keys; keys that are not stored are missing from the result.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(unique_keys), _QUERY_CHUNK_SIZE):
+                chunk = unique_keys[start:start + _QUERY_CHUNK_SIZE]
+                rows = self._connection.execute(
+                    f"SELECT key, {self._value_column} FROM {self._table} WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    f"UPDATE {self._table} SET last_access = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._connection.commit()
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[Value]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: List[Tuple[str, Value]]):
+        """
+        Store (key, value) pairs and evict old entries if over budget.
+        """
+        now = time.time()
+        rows = [
+            (key, value, len(value.encode("utf-8") if isinstance(value, str) else value), now)
+            for key, value in items
+        ]
+        with self._lock:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self._table} (key, {self._value_column}, size, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._connection.commit()
+
+    def put(self, key: str, value: Value):
+        self.put_many([(key, value)])
+
+    def _evict(self):
+        """Delete least recently used entries until the store fits in max_size_bytes."""
+        total_size = self._connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self._table}").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+
+        for key, size in self._connection.execute(f"SELECT key, size FROM {self._table} ORDER BY last_access ASC").fetchall():
+            if total_size <= self.max_size_bytes:
+                break
+            self._connection.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+            total_size -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._connection.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self._table}"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,238 @@
+import time
+import json
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000)
+
+# Name of the agent or pipeline stage making the LLM calls, e.g. "analyze_images" or "reply_agent"
+current_stage = contextvars.ContextVar("llm_stage", default="unknown")
+# The TelemetryRun collecting the calls of the current ingestion run, if any
+current_run = contextvars.ContextVar("llm_telemetry_run", default=None)
+
+
+class LLMCallRecord(BaseModel):
+    """
+    Telemetry of one LLM call (or one LLM result cache hit).
+    """
+    timestamp: float
+    stage: str
+    deployment: str = ""
+    endpoint: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    queue_seconds: float = 0.0  # Time spent waiting for the rate limiter
+    latency_seconds: float = 0.0  # Network latency of the successful attempt
+    retries: int = 0
+    outcome: str = "success"  # success, error, cache_hit or batch (a request of an offline batch job)
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class TelemetryRun:
+    """
+    The records of the LLM calls made during one ingestion run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[LLMCallRecord] = []
+
+    def add(self, record: LLMCallRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Per-stage totals: calls, cache hits, errors, tokens, retries and latency.
+        """
+        stages = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            stage = stages.setdefault(record.stage, {
+                "calls": 0, "cache_hits": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cached_tokens": 0, "retries": 0, "queue_seconds": 0.0, "latency_seconds": 0.0
+            })
+            stage["calls"] += int(record.outcome != "cache_hit")
+            stage["cache_hits"] += int(record.outcome == "cache_hit")
+            stage["errors"] += int(record.outcome == "error")
+            stage["prompt_tokens"] += record.prompt_tokens
+            stage["completion_tokens"] += record.completion_tokens
+            stage["cached_tokens"] += record.cached_tokens
+            stage["retries"] += record.retries
+            stage["queue_seconds"] += record.queue_seconds
+            stage["latency_seconds"] += record.latency_seconds
+        return stages
+
+    def dump_json(self, path):
+        with self._lock:
+            records = [record.model_dump() for record in self.records]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "calls": records}, f, indent=4)
+
+
+class LLMTelemetry:
+    """
+    Process-wide aggregation of LLM call telemetry into counters and histograms,
+    labelled by stage and deployment, exportable in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self._histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+
+    def _observe(self, name: str, labels: Tuple, value: float, buckets: Tuple[float, ...]):
+        key = (name, labels)
+        if key not in self._histograms:
+            self._histograms[key] = _Histogram(buckets)
+        self._histograms[key].observe(value)
+
+    def record(self, record: LLMCallRecord):
+        labels = (("stage", record.stage), ("deployment", record.deployment))
+        with self._lock:
+            self._counters[("llm_calls_total", labels + (("outcome", record.outcome),))] += 1
+            if record.outcome != "cache_hit":
+                self._counters[("llm_retries_total", labels)] += record.retries
+                for token_type in ("prompt", "completion", "cached"):
+                    self._counters[("llm_tokens_total", labels + (("type", token_type),))] += getattr(record, f"{token_type}_tokens")
+                if record.outcome != "batch":
+                    self._observe("llm_queue_seconds", labels, record.queue_seconds, LATENCY_BUCKETS)
+                if record.outcome == "success":
+                    self._observe("llm_latency_seconds", labels, record.latency_seconds, LATENCY_BUCKETS)
+                if record.outcome != "error":
+                    self._observe("llm_prompt_tokens", labels, record.prompt_tokens, TOKEN_BUCKETS)
+
+        run = current_run.get()
+        if run is not None:
+            run.add(record)
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+        def escape(value) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs = [f'{name}="{escape(value)}"' for name, value in labels + extra]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def to_prometheus(self) -> str:
+        """
+        Export all counters and histograms in the Prometheus text exposition format.
+        """
+        descriptions = {
+            "llm_calls_total": ("counter", "LLM calls by outcome (success, error, cache_hit, batch)"),
+            "llm_retries_total": ("counter", "Retries of LLM calls after 429s and transient errors"),
+            "llm_tokens_total": ("counter", "Tokens used by LLM calls by type (prompt, completion, cached)"),
+            "llm_queue_seconds": ("histogram", "Time LLM calls waited for the rate limiter"),
+            "llm_latency_seconds": ("histogram", "Network latency of successful LLM calls"),
+            "llm_prompt_tokens": ("histogram", "Prompt tokens per LLM call"),
+        }
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.buckets), list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, description) in descriptions.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+            else:
+                for (metric, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{name}_bucket{self._format_labels(labels, (('le', f'{bound:g}'),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {total:g}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+telemetry = LLMTelemetry()
+
+
+@contextmanager
+def llm_stage(stage: str):
+    """
+    Label the LLM calls made inside this block with the given agent or pipeline stage name.
+    """
+    token = current_stage.set(stage)
+    try:
+        yield
+    finally:
+        current_stage.reset(token)
+
+
+@contextmanager
+def telemetry_run(run: Optional[TelemetryRun]):
+    """
+    Also collect the LLM calls made inside this block into run.
+    """
+    token = current_run.set(run)
+    try:
+        yield run
+    finally:
+        current_run.reset(token)
+
+
+def _field(value, name: str):
+    if value is None:
+        return None
+    return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+
+
+def record_llm_call(
+    client=None,
+    deployment: str = "",
+    response=None,
+    queue_seconds: float = 0.0,
+    latency_seconds: float = 0.0,
+    retries: int = 0,
+    outcome: str = "success"
+):
+    """
+    Record one LLM call, reading the token counts from the usage block of the response
+    (an SDK response object, or a response body dict as found in batch results).
+    """
+    usage = _field(response, "usage")
+    telemetry.record(LLMCallRecord(
+        timestamp=time.time(),
+        stage=current_stage.get(),
+        deployment=deployment or "",
+        endpoint=str(getattr(client, "base_url", "")),
+        prompt_tokens=_field(usage, "prompt_tokens") or 0,
+        completion_tokens=_field(usage, "completion_tokens") or 0,
+        cached_tokens=_field(_field(usage, "prompt_tokens_details"), "cached_tokens") or 0,
+        queue_seconds=queue_seconds,
+        latency_seconds=latency_seconds,
+        retries=retries,
+        outcome=outcome
+    ))
+
+
+def record_cache_hit(deployment: str = ""):
+    telemetry.record(LLMCallRecord(timestamp=time.time(), stage=current_stage.get(), deployment=deployment or "", outcome="cache_hit"))
@@ -0,0 +1,106 @@
+import re
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+from mm_doc_proc.utils.tokenizer import get_encoding, encode_batch
+
+
+PAGE_BOUNDARY = 3
+HEADING_BOUNDARY = 2
+PARAGRAPH_BOUNDARY = 1
+
+# Page markers as written by the ingestion pipeline, e.g. "##### --- Page 12 ---"
+_PAGE_PATTERN = re.compile(r"^##### --- Page \d+ ---", re.MULTILINE)
+_HEADING_PATTERN = re.compile(r"^#{1,6} ", re.MULTILINE)
+# A paragraph starts at the first non-blank character after a blank line
+_PARAGRAPH_PATTERN = re.compile(r"\n[ \t]*\n\s*(?=\S)")
+
+# A chunk is only ended early at a boundary if it is at least this full
+MIN_CHUNK_FILL = 0.5
+
+
+def find_boundaries(text: str) -> Dict[int, int]:
+    """
+    Character offsets where a chunk may start, with their priority: page markers, then headings, then paragraphs.
+    """
+    boundaries = {}
+    for match in _PARAGRAPH_PATTERN.finditer(text):
+        boundaries[match.end()] = PARAGRAPH_BOUNDARY
+    for match in _HEADING_PATTERN.finditer(text):
+        boundaries[match.start()] = HEADING_BOUNDARY
+    for match in _PAGE_PATTERN.finditer(text):
+        boundaries[match.start()] = PAGE_BOUNDARY
+    return boundaries
+
+
+def _best_boundary(boundary_positions: Dict[int, List[int]], low: int, high: int) -> Optional[int]:
+    """The last boundary in [low, high] of the highest priority that has one."""
+    for priority in (PAGE_BOUNDARY, HEADING_BOUNDARY, PARAGRAPH_BOUNDARY):
+        positions = boundary_positions[priority]
+        i = bisect.bisect_right(positions, high) - 1
+        if i >= 0 and positions[i] >= low:
+            return positions[i]
+    return None
+
+
+def _first_boundary(boundary_positions: Dict[int, List[int]], low: int, high: int) -> Optional[int]:
+    """The first boundary of any priority in [low, high)."""
+    candidates = []
+    for positions in boundary_positions.values():
+        i = bisect.bisect_left(positions, low)
+        if i < len(positions) and positions[i] < high:
+            candidates.append(positions[i])
+    return min(candidates) if candidates else None
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int,
+    overlap_tokens: int = 0,
+    model: Optional[str] = None,
+    min_fill: float = MIN_CHUNK_FILL
+) -> List[Tuple[str, int]]:
+    """
+    Split text into chunks of at most max_tokens tokens and return (chunk text, token count) pairs.
+
+    The text is tokenized once, and chunks are slices of that token array. Each chunk ends at the best
+    boundary in its second half (a page marker, else a heading, else a paragraph break), and only
+    falls back to a hard cut when there is none. With overlap_tokens, each chunk starts up to that
+    many tokens before the end of the previous one, at a boundary if there is one.
+    """
+    if not text:
+        return []
+
+    # Tokenize the text between boundaries, so that boundary offsets map to token positions
+    boundaries = find_boundaries(text)
+    offsets = [0] + sorted(offset for offset in boundaries if 0 < offset < len(text))
+    segments = [text[start:end] for start, end in zip(offsets, offsets[1:] + [len(text)])]
+
+    tokens = []
+    boundary_positions = {PAGE_BOUNDARY: [], HEADING_BOUNDARY: [], PARAGRAPH_BOUNDARY: []}
+    for offset, segment_tokens in zip(offsets, encode_batch(segments, model)):
+        if offset in boundaries:
+            boundary_positions[boundaries[offset]].append(len(tokens))
+        tokens.extend(segment_tokens)
+
+    total_tokens = len(tokens)
+    if total_tokens <= max_tokens:
+        return [(text, total_tokens)]
+
+    encoding = get_encoding(model)
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    chunks = []
+    start = 0
+    while start < total_tokens:
+        end = min(start + max_tokens, total_tokens)
+        if end < total_tokens:
+            end = _best_boundary(boundary_positions, start + max(1, int(max_tokens * min_fill)), end) or end
+        chunks.append((encoding.decode(tokens[start:end]), end - start))
+        if end == total_tokens:
+            break
+
+        next_start = end
+        if overlap_tokens:
+            next_start = _first_boundary(boundary_positions, end - overlap_tokens, end) or (end - overlap_tokens)
+        start = max(next_start, start + 1)
+    return chunks
@@ -1,7 +1,7 @@
 import json
 import json_repair
 import re
-import tiktoken
+from mm_doc_proc.utils.tokenizer import get_encoding, count_tokens, truncate_tokens
 from IPython.display import display
 import pandas as pd
 
@@ -10,22 +10,13 @@ def show_json(obj):
     display(json.loads(obj.model_dump_json()))
 
 def get_encoder(model = "gpt-4o"):
-    if model == "gpt-4o":
-        return tiktoken.get_encoding("o200k_base")       
-    if model == "o1":
-        return tiktoken.get_encoding("o200k_base")       
-    if model == "mini":
-        return tiktoken.get_encoding("o200k_base")       
-    else:
-        return tiktoken.get_encoding("o200k_base")
+    return get_encoding(model)
 
 def get_token_count(text, model = "gpt-4o"):
-    enc = get_encoder(model)
-    return len(enc.encode(text))
+    return count_tokens(text, model)
 
 def limit_token_count(text, limit = 100000, model = "gpt-4"):
-    enc = get_encoder(model)
-    return enc.decode(enc.encode(text)[:limit])
+    return truncate_tokens(text, limit, model)
 
 def extract_json(s):
     code = re.search(r"```json(.*?)```", s, re.DOTALL)
@@ -0,0 +1,79 @@
+import functools
+from typing import List, Optional
+
+import tiktoken
+
+
+DEFAULT_TOKENIZER_MODEL = "gpt-4o"
+BATCH_COUNT_THREADS = 8
+
+# Model name prefixes and their encodings, checked before tiktoken's own table so that
+# model families tiktoken does not know yet (and deployment names such as "gpt-4o-prod") resolve too
+MODEL_PREFIX_ENCODINGS = [
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-4.5", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("mini", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-35", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding", "cl100k_base"),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def encoding_name_for_model(model: Optional[str] = None) -> str:
+    """
+    Name of the tiktoken encoding of a model or deployment name, o200k_base if it cannot be told.
+    """
+    model = (model or DEFAULT_TOKENIZER_MODEL).lower()
+    for prefix, encoding_name in MODEL_PREFIX_ENCODINGS:
+        if model.startswith(prefix):
+            return encoding_name
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        return "o200k_base"
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding_by_name(encoding_name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(encoding_name)
+
+
+def get_encoding(model: Optional[str] = None) -> tiktoken.Encoding:
+    """
+    The tiktoken encoding of a model, loaded once per process and shared by all callers.
+    """
+    return _get_encoding_by_name(encoding_name_for_model(model))
+
+
+def encode(text: str, model: Optional[str] = None) -> List[int]:
+    # Special token strings in documents are counted as the plain text they are
+    return get_encoding(model).encode_ordinary(text)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    return len(encode(text, model))
+
+
+def count_tokens_batch(texts: List[str], model: Optional[str] = None, num_threads: int = BATCH_COUNT_THREADS) -> List[int]:
+    """
+    Count the tokens of many texts (e.g. chunks or pages) at once, tokenizing them in parallel threads.
+    """
+    return [len(tokens) for tokens in encode_batch(texts, model, num_threads)]
+
+
+def encode_batch(texts: List[str], model: Optional[str] = None, num_threads: int = BATCH_COUNT_THREADS) -> List[List[int]]:
+    if not texts:
+        return []
+    # tiktoken releases the GIL while encoding, so the threads run in parallel
+    return get_encoding(model).encode_ordinary_batch(texts, num_threads=num_threads)
+
+
+def truncate_tokens(text: str, limit: int, model: Optional[str] = None) -> str:
+    encoding = get_encoding(model)
+    return encoding.decode(encoding.encode_ordinary(text)[:limit])
@@ -1,19 +1,36 @@
-import tiktoken
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
 from io import BytesIO
-from openai import AzureOpenAI
+from collections import OrderedDict
 import json
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Callable, Iterator
 import logging
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import PyPDF2
+from multiprocessing.dummy import Pool as ThreadPool
 from configuration.config import ConfigLoader
 from mm_doc_proc.multimodal_processing_pipeline.configuration_models import ProcessingPipelineConfiguration
 from mm_doc_proc.multimodal_processing_pipeline.pdf_ingestion_pipeline import PDFIngestionPipeline
 from mm_doc_proc.multimodal_processing_pipeline.data_models import DocumentContent
+from mm_doc_proc.multimodal_processing_pipeline.llm_result_cache import LLMResultCache
+from mm_doc_proc.utils.document_store import DocumentStore
 from mm_doc_proc.utils.openai_data_models import (
     MulitmodalProcessingModelInfo, 
-    TextProcessingModelnfo
+    TextProcessingModelnfo,
+    DeploymentInfo,
+    get_pooled_client
 )
+from mm_doc_proc.utils.deployment_router import get_router
+from mm_doc_proc.utils.rate_limiter import rate_limited_call
+from mm_doc_proc.utils.telemetry import llm_stage, record_cache_hit
+from mm_doc_proc.utils import tokenizer
+from mm_doc_proc.utils.text_chunker import chunk_text
+from mm_doc_proc.utils.lexical_index import BM25Index
+from mm_doc_proc.utils.prompt_registry import prompt_registry
 
 # Initialize configuration
 if 'config' not in st.session_state:
@@ -21,26 +38,37 @@ if 'config' not in st.session_state:
 
 # Configure OpenAI
 azure_config = st.session_state.config.get_azure_config()
-client = AzureOpenAI(
-    api_key=azure_config['api_key'],
-    api_version=azure_config['api_version'],
-    azure_endpoint=azure_config['azure_endpoint']
-)
+# Pooled client without SDK retries, so that 429s are retried by the shared rate limiter
+client = get_pooled_client("azure", azure_config['azure_endpoint'], azure_config['api_key'], azure_config['api_version'])
 deployment_name = azure_config['deployment_name']
 
-# Initialize tokenizer
-encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+# Tokenizer model, picks the encoding shared with the ingestion pipeline
+tokenizer_model = azure_config['model_name']
 
 def count_tokens(text: str) -> int:
     """Count the number of tokens in a text string."""
-    return len(encoding.encode(text))
+    return tokenizer.count_tokens(text, tokenizer_model)
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Count tokens of many texts (e.g. chunks) at once, in parallel threads."""
+    return tokenizer.count_tokens_batch(texts, tokenizer_model)
+
+# Each GPT extraction run writes its pipeline output to its own directory under this one
+_GPT_OUTPUT_ROOT = 'tmp'
+
+def _gpt_output_directory() -> tempfile.TemporaryDirectory:
+    """A fresh output directory for one pipeline run, so that concurrent runs never overwrite or resume each other's pages."""
+    os.makedirs(_GPT_OUTPUT_ROOT, exist_ok=True)
+    return tempfile.TemporaryDirectory(prefix='gpt_extraction_', dir=_GPT_OUTPUT_ROOT)
 
-def extract_text_from_pdf_gpt(pdf_file) -> Tuple[List[str], List[int]]:
-    """Extract text from a PDF file using multimodal processing pipeline."""
+def _gpt_pipeline_config(pdf_file) -> ProcessingPipelineConfiguration:
+    """Configuration of the multimodal processing pipeline used for GPT-based PDF extraction.
+
+    Its output_directory is set per run (see _gpt_output_directory).
+    """
     # Create pipeline configuration
     pipeline_config = ProcessingPipelineConfiguration(
         pdf_path=pdf_file,
-        output_directory= 'tmp/',
         process_text=True,  # Enable text processing
         process_images=True,  # Enable image processing
         process_tables=True,  # Enable table processing
@@ -69,73 +97,216 @@ def extract_text_from_pdf_gpt(pdf_file) -> Tuple[List[str], List[int]]:
         model=deployment_name,
         api_version=azure_config['api_version']
     )
-    
-    # Initialize and run pipeline
-    pipeline = PDFIngestionPipeline(pipeline_config)
-    document_content: DocumentContent = pipeline.process_pdf()
-    document_text = document_content.full_text
-    total_tokens = count_tokens(document_text)
-    max_chunk_tokens = st.session_state.config.get_processing_config()['max_chunk_tokens']
-        
-    #     # Split into chunks if necessary
-    if total_tokens > max_chunk_tokens:
-        chunks = split_text_into_chunks(document_text)
-        chunk_tokens = [count_tokens(chunk) for chunk in chunks]
-        return chunks, chunk_tokens
+
+    return pipeline_config
+
+# Bytes read at a time when hashing a PDF
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+_document_stores = {}
+_document_stores_lock = threading.Lock()
+
+def get_document_store() -> Optional[DocumentStore]:
+    """The persistent store of extracted chunks and appendices in the document_store_directory of the
+    document_processing config, or None if it is not set."""
+    processing_config = st.session_state.config.get_processing_config()
+    store_directory = processing_config.get('document_store_directory')
+    if not store_directory:
+        return None
+    with _document_stores_lock:
+        if store_directory not in _document_stores:
+            _document_stores[store_directory] = DocumentStore(
+                store_directory, max_size_mb=processing_config.get('document_store_max_size_mb', 1024)
+            )
+        return _document_stores[store_directory]
+
+def file_content_hash(pdf_file) -> str:
+    """SHA-256 of a PDF given as a path or a binary file object, read block by block so that large files are never held in memory at once."""
+    digest = hashlib.sha256()
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                digest.update(block)
     else:
-        return [document_text], [total_tokens]
+        position = pdf_file.tell()
+        for block in iter(lambda: pdf_file.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        pdf_file.seek(position)
+    return digest.hexdigest()
+
+def _extraction_store_key(pdf_file, extraction_method: str, pipeline_config: Optional[ProcessingPipelineConfiguration] = None) -> Optional[str]:
+    """Document store key of a PDF's chunks: its content hash, the extraction method and the chunking config.
+
+    For extractions by the ingestion pipeline (pipeline_config), its models and prompts are part of the key too.
+    """
+    store = get_document_store()
+    if store is None:
+        return None
+    processing_config = st.session_state.config.get_processing_config()
+    extraction_config = {
+        'max_chunk_tokens': processing_config['max_chunk_tokens'],
+        'chunk_overlap_tokens': processing_config.get('chunk_overlap_tokens', 0),
+        'tokenizer_model': tokenizer_model
+    }
+    if pipeline_config is not None:
+        extraction_config['text_model'] = LLMResultCache.model_identity(pipeline_config.text_model)
+        extraction_config['multimodal_model'] = LLMResultCache.model_identity(pipeline_config.multimodal_model)
+        extraction_config['prompts'] = prompt_registry.fingerprint()
+    return store.make_key(f"extraction_{extraction_method}", file_content_hash(pdf_file), json.dumps(extraction_config, sort_keys=True))
+
+def _get_stored_extraction(key: Optional[str]) -> Optional[Tuple[List[str], List[int]]]:
+    if key is None:
+        return None
+    stored = get_document_store().get(key)
+    if stored is None:
+        return None
+    return stored['chunks'], stored['chunk_tokens']
+
+def _put_stored_extraction(key: Optional[str], chunks: List[str], chunk_tokens: List[int]):
+    if key is not None:
+        get_document_store().put(key, {'chunks': chunks, 'chunk_tokens': chunk_tokens})
+
+def _chunk_document_content(document_content: DocumentContent) -> Tuple[List[str], List[int]]:
+    """Split the extracted document text into chunks if it exceeds the max chunk size."""
+    return split_text_into_chunks_with_counts(document_content.full_text)
+
+def extract_text_from_pdf_gpt(pdf_file, progress_callback: Optional[Callable[[int, int], None]] = None) -> Tuple[List[str], List[int]]:
+    """Extract text from a PDF file using multimodal processing pipeline.
+
+    progress_callback, if given, is called with (pages_done, total_pages) as each page finishes.
+    A PDF already in the document store is not extracted again.
+    """
+    pipeline_config = _gpt_pipeline_config(pdf_file)
+    store_key = _extraction_store_key(pdf_file, 'GPT', pipeline_config)
+    stored = _get_stored_extraction(store_key)
+    if stored is not None:
+        return stored
+
+    # Initialize and run pipeline
+    with _gpt_output_directory() as output_directory:
+        pipeline_config.output_directory = output_directory
+        pipeline = PDFIngestionPipeline(pipeline_config)
+        for pages_done, _ in enumerate(pipeline.iter_pages(), start=1):
+            if progress_callback:
+                progress_callback(pages_done, pipeline.metadata.total_pages)
+        chunks, chunk_tokens = _chunk_document_content(pipeline.document)
+    _put_stored_extraction(store_key, chunks, chunk_tokens)
+    return chunks, chunk_tokens
+
+async def extract_text_from_pdf_gpt_async(pdf_file) -> Tuple[List[str], List[int]]:
+    """Async version of extract_text_from_pdf_gpt, for use from an event loop (e.g. the FastAPI app).
+
+    File hashing, document store access and other blocking steps run in worker threads, not on the event loop.
+    """
+    pipeline_config = _gpt_pipeline_config(pdf_file)
+    store_key = await asyncio.to_thread(_extraction_store_key, pdf_file, 'GPT', pipeline_config)
+    stored = await asyncio.to_thread(_get_stored_extraction, store_key)
+    if stored is not None:
+        return stored
+
+    output_directory = await asyncio.to_thread(_gpt_output_directory)
+    try:
+        pipeline_config.output_directory = output_directory.name
+        # Loads the PDF metadata and hashes the file
+        pipeline = await asyncio.to_thread(PDFIngestionPipeline, pipeline_config)
+        document_content = await pipeline.process_pdf_async()
+        chunks, chunk_tokens = await asyncio.to_thread(_chunk_document_content, document_content)
+    finally:
+        await asyncio.to_thread(output_directory.cleanup)
+    await asyncio.to_thread(_put_stored_extraction, store_key, chunks, chunk_tokens)
+    return chunks, chunk_tokens
 
 def extract_text_from_pdf_pypdf2(pdf_file) -> Tuple[List[str], List[int]]:
-    """Extract text from a PDF file and return text chunks and their token counts."""
+    """Extract text from a PDF file and return text chunks and their token counts.
+
+    A PDF already in the document store is not extracted again.
+    """
+    store_key = _extraction_store_key(pdf_file, 'PyPDF2')
+    stored = _get_stored_extraction(store_key)
+    if stored is not None:
+        return stored
+
     pdf_reader = PyPDF2.PdfReader(pdf_file)
     full_text = ""
     for page in pdf_reader.pages:
         full_text += page.extract_text()
     
-    total_tokens = count_tokens(full_text)
-    max_chunk_tokens = st.session_state.config.get_processing_config()['max_chunk_tokens']
-    
-    if total_tokens > max_chunk_tokens:
-        chunks = split_text_into_chunks(full_text)
-        chunk_tokens = [count_tokens(chunk) for chunk in chunks]
-        return chunks, chunk_tokens
-    else:
-        return [full_text], [total_tokens]
+    chunks, chunk_tokens = split_text_into_chunks_with_counts(full_text)
+    _put_stored_extraction(store_key, chunks, chunk_tokens)
+    return chunks, chunk_tokens
+
+
+def split_text_into_chunks_with_counts(text: str, max_tokens: int = None) -> Tuple[List[str], List[int]]:
+    """Split text into chunks of maximum token size, preferring page, heading and paragraph boundaries.
+
+    Returns the chunks and their token counts. Text that fits in one chunk is returned as is.
+    """
+    processing_config = st.session_state.config.get_processing_config()
+    if max_tokens is None:
+        max_tokens = processing_config['max_chunk_tokens']
 
+    chunks = chunk_text(text, max_tokens, overlap_tokens=processing_config.get('chunk_overlap_tokens', 0), model=tokenizer_model)
+    if not chunks:
+        return [text], [0]
+    return [chunk for chunk, _ in chunks], [tokens for _, tokens in chunks]
 
 def split_text_into_chunks(text: str, max_tokens: int = None) -> List[str]:
     """Split text into chunks of maximum token size."""
-    if max_tokens is None:
-        max_tokens = st.session_state.config.get_processing_config()['max_chunk_tokens']
-        
-    tokens = encoding.encode(text)
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for token in tokens:
-        if current_length >= max_tokens:
-            chunk_text = encoding.decode(current_chunk)
-            chunks.append(chunk_text)
-            current_chunk = []
-            current_length = 0
-        
-        current_chunk.append(token)
-        current_length += 1
-    
-    if current_chunk:
-        chunk_text = encoding.decode(current_chunk)
-        chunks.append(chunk_text)
-    
-    return chunks
+    return split_text_into_chunks_with_counts(text, max_tokens)[0]
+
+def _deployment_pool(pool_config: Dict) -> List[DeploymentInfo]:
+    """The configured deployment plus the extra deployments of the deployment_pool config section."""
+    deployments = [DeploymentInfo(
+        endpoint=azure_config['azure_endpoint'] or "",
+        key=azure_config['api_key'] or "",
+        model=deployment_name or "",
+        api_version=azure_config['api_version']
+    )]
+    for deployment in pool_config.get('deployments', []):
+        deployments.append(DeploymentInfo(
+            endpoint=deployment['azure_endpoint'],
+            key=os.getenv(deployment.get('api_key_env', 'OPENAI_API_KEY'), ""),
+            model=deployment['deployment_name'],
+            api_version=deployment.get('api_version', azure_config['api_version']),
+            weight=deployment.get('weight', 1.0),
+            requests_per_minute=deployment.get('requests_per_minute'),
+            tokens_per_minute=deployment.get('tokens_per_minute')
+        ))
+    return deployments
+
+def _chat_completion(agent: str, messages: List[Dict], temperature: float, max_tokens: int, stream: bool = False):
+    """Run an agent's chat completion, spread over the deployment pool if one is configured, and record its telemetry under the agent's name."""
+    # Streams end with a chunk carrying the usage, so that prompt cache hits can be reported
+    stream_options = {"stream_options": {"include_usage": True}} if stream else {}
+
+    def create(chat_client, model):
+        return rate_limited_call(
+            chat_client, model, messages,
+            lambda: chat_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=stream,
+                **stream_options
+            )
+        )
+
+    pool_config = st.session_state.config.get_deployment_pool_config()
+    with llm_stage(agent):
+        if not pool_config.get('deployments'):
+            return create(client, deployment_name)
+
+        router = get_router(_deployment_pool(pool_config), pool_config.get('hedge_after_seconds'))
+        return router.call(create)
 
 def get_summary(text: str) -> str:
     """Get summary of text using OpenAI."""
     config = st.session_state.config.get_agent_config('document_analysis_agent')
     prompt = config['model_prompt'] + text
     
-    response = client.chat.completions.create(
-        model=deployment_name,
+    response = _chat_completion(
+        'document_analysis_agent',
         messages=[
             {"role": "system", "content": config['system_prompt']},
             {"role": "user", "content": prompt}
@@ -147,28 +318,162 @@ def get_summary(text: str) -> str:
     return response.choices[0].message.content
 
 
+def _thread_map(func: Callable, items: List, max_workers: int) -> List:
+    """Map func over items in up to max_workers threads, in order, or in this thread if there is only one item."""
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    # Worker threads need the Streamlit script context to read st.session_state
+    script_run_ctx = get_script_run_ctx()
+    with ThreadPool(min(max_workers, len(items)),
+                    initializer=lambda: add_script_run_ctx(ctx=script_run_ctx)) as pool:
+        return pool.map(func, items)
+
 def process_document_chunks(file_name: str, chunks: List[str], chunk_tokens: List[int]) -> Tuple[Dict[str, str], Dict[str, str], Dict[str, int]]:
-    """Process multiple chunks of a document and return their data."""
+    """Process multiple chunks of a document and return their data.
+
+    The parts are summarized concurrently (up to max_concurrent_summaries of the document_processing
+    config at once) and merged in part order. A part whose summary fails is reported and left out,
+    and the other parts are kept; if every part fails, the first error is raised.
+
+    Appendices are kept in the document store, keyed by the chunk text and the document_analysis_agent
+    config, so that a part summarized before (in any session) makes no LLM call.
+
+    If warm_up_prompt_cache is set in the reply_agent config, each chunk is also sent to the Reply Agent
+    once (see warm_up_reply_agent), so that the first question on it is served from the prompt cache.
+    """
+    warm_up = st.session_state.config.get_agent_config('reply_agent').get('warm_up_prompt_cache', False)
+    max_concurrent_summaries = st.session_state.config.get_processing_config().get('max_concurrent_summaries', 4)
+    store = get_document_store()
+    appendix_config = json.dumps(
+        {**st.session_state.config.get_agent_config('document_analysis_agent'), 'deployment': deployment_name},
+        sort_keys=True
+    )
+
+    chunk_names = [
+        f"{file_name} (Part {i+1}/{len(chunks)})" if len(chunks) > 1 else file_name
+        for i in range(len(chunks))
+    ]
+
+    def summarize(chunk: str):
+        try:
+            store_key = store.make_key("document_appendix", chunk, appendix_config) if store else None
+            summary = store.get(store_key) if store else None
+            if summary is not None:
+                with llm_stage('document_analysis_agent'):
+                    record_cache_hit(deployment_name)
+            else:
+                summary = get_summary(chunk)
+                if store:
+                    store.put(store_key, summary)
+        except Exception as e:
+            return None, e
+
+        if warm_up:
+            # Warming up is only an optimisation, a part is kept even if it fails
+            try:
+                warm_up_reply_agent(chunk)
+            except Exception as e:
+                logging.warning(f"Reply Agent prompt cache warm-up failed: {e}")
+        return summary, None
+
+    results = _thread_map(summarize, chunks, max_concurrent_summaries)
+
     documents = {}
     summaries = {}
     token_counts = {}
-    
-    for i, (chunk, tokens) in enumerate(zip(chunks, chunk_tokens)):
-        if len(chunks) > 1:
-            chunk_name = f"{file_name} (Part {i+1}/{len(chunks)})"
-        else:
-            chunk_name = file_name
-            
+    errors = []
+    for chunk_name, chunk, tokens, (summary, error) in zip(chunk_names, chunks, chunk_tokens, results):
+        if error is not None:
+            logging.error(f"Document Analysis Agent failed on {chunk_name}: {error}")
+            st.error(f"Document Analysis Agent failed on {chunk_name}, this part is skipped: {error}")
+            errors.append(error)
+            continue
+
         documents[chunk_name] = chunk
-        token_counts[chunk_name] = tokens
-        
-        summary = get_summary(chunk)
         summaries[chunk_name] = summary
+        token_counts[chunk_name] = tokens
+
+    if errors and not documents:
+        raise errors[0]
     
     return documents, summaries, token_counts
 
-def select_relevant_document(question: str, summaries: Dict[str, str]) -> Tuple[str, Dict[str, float]]:
-    """Select the most relevant document based on the question and summaries."""
+# Lexical indexes of document sets for callers without their own index (e.g. API requests), least recently used first
+_LEXICAL_INDEX_CACHE_SIZE = 16
+_lexical_indexes = OrderedDict()
+_lexical_indexes_lock = threading.Lock()
+
+def _indexed_texts(summaries: Dict[str, str], documents: Optional[Dict[str, str]]) -> Dict[str, Tuple[str, str]]:
+    """The text indexed for each document (its appendix and, if given, its text) and the SHA-256 of that text as its version."""
+    indexed_texts = {}
+    for name, summary in summaries.items():
+        text = summary + "\n" + (documents or {}).get(name, "")
+        indexed_texts[name] = (text, hashlib.sha256(text.encode("utf-8")).hexdigest())
+    return indexed_texts
+
+def _lexical_index_for(indexed_texts: Dict[str, Tuple[str, str]]) -> BM25Index:
+    """The lexical index of exactly this document set (names, appendices and texts), shared by the requests on it."""
+    digest = hashlib.sha256()
+    for name, (_, version) in sorted(indexed_texts.items()):
+        for part in (name.encode("utf-8"), version.encode("ascii")):
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+    key = digest.hexdigest()
+
+    with _lexical_indexes_lock:
+        index = _lexical_indexes.pop(key, None)
+        if index is None:
+            index = BM25Index()
+        _lexical_indexes[key] = index
+        while len(_lexical_indexes) > _LEXICAL_INDEX_CACHE_SIZE:
+            _lexical_indexes.popitem(last=False)
+    return index
+
+def shortlist_documents(
+    question: str,
+    summaries: Dict[str, str],
+    documents: Optional[Dict[str, str]] = None,
+    index: Optional[BM25Index] = None
+) -> Dict[str, str]:
+    """Shortlist the documents most likely to answer the question with a local BM25 index, before the Researcher Agent scores them.
+
+    The index covers the appendices and, if given, the document texts. A caller with a document set of
+    its own (e.g. a Streamlit session) passes its index, which is updated incrementally: only new
+    documents and documents whose appendix or text was edited are (re)indexed, and removed ones are dropped.
+    Without one, the index of this exact document set is used, so that callers with different document
+    sets (e.g. API requests) never share an index.
+    Returns at most shortlist_size of the researcher_agent config summaries (all of them if it is 0),
+    topped up in their original order if fewer documents match the question.
+    """
+    shortlist_size = st.session_state.config.get_agent_config('researcher_agent').get('shortlist_size', 0)
+    if not shortlist_size or len(summaries) <= shortlist_size:
+        return summaries
+
+    indexed_texts = _indexed_texts(summaries, documents)
+    if index is None:
+        index = _lexical_index_for(indexed_texts)
+
+    for name in index.names() - summaries.keys():
+        index.remove(name)
+    for name, (text, version) in indexed_texts.items():
+        # The hash of the indexed text is the version, so that edited appendices or documents are reindexed
+        if name not in index or index.version(name) != version:
+            index.add(name, text, version=version)
+
+    shortlist = [name for name, _ in index.search(question, shortlist_size)]
+    for name in summaries:
+        if len(shortlist) >= shortlist_size:
+            break
+        if name not in shortlist:
+            shortlist.append(name)
+    return {name: summaries[name] for name in shortlist}
+
+def _score_documents(question: str, summaries: Dict[str, str]) -> Dict[str, float]:
+    """Have the Researcher Agent score the relevance of the given documents to the question in one call.
+
+    Documents the agent leaves out score 0; if its answer is not valid JSON, all of them do.
+    """
     config = st.session_state.config.get_agent_config('researcher_agent')
     prompt = config['model_prompt'] + "\n\nDocuments and summaries:\n\n"
     
@@ -177,8 +482,8 @@ def select_relevant_document(question: str, summaries: Dict[str, str]) -> Tuple[
     
     prompt += f"Question: {question}\n\nRelevance scores:"
     
-    response = client.chat.completions.create(
-        model=deployment_name,
+    response = _chat_completion(
+        'researcher_agent',
         messages=[
             {"role": "system", "content": config['system_prompt']},
             {"role": "user", "content": prompt}
@@ -190,25 +495,176 @@ def select_relevant_document(question: str, summaries: Dict[str, str]) -> Tuple[
     try:
         logging.info(response.choices[0].message.content)
         relevance_scores = json.loads(response.choices[0].message.content)
-        most_relevant = max(relevance_scores.items(), key=lambda x: x[1])[0]
-        return most_relevant, relevance_scores
     except json.JSONDecodeError:
         st.error("Error parsing relevance scores. Using fallback method.")
-        return list(summaries.keys())[0], {k: 0 for k in summaries.keys()}
+        relevance_scores = {}
+    return {filename: relevance_scores.get(filename, 0) for filename in summaries}
+
+def _shard_summaries(summaries: Dict[str, str], max_tokens: int, max_documents: int) -> List[Dict[str, str]]:
+    """Split the summaries, in order, into shards of at most max_tokens tokens and max_documents documents.
+
+    A summary larger than max_tokens gets a shard of its own.
+    """
+    entry_tokens = count_tokens_batch([f"Document: {filename}\nSummary: {summary}\n\n" for filename, summary in summaries.items()])
+    shards = []
+    shard, shard_tokens = {}, 0
+    for (filename, summary), tokens in zip(summaries.items(), entry_tokens):
+        if shard and (shard_tokens + tokens > max_tokens or len(shard) >= max_documents):
+            shards.append(shard)
+            shard, shard_tokens = {}, 0
+        shard[filename] = summary
+        shard_tokens += tokens
+    if shard:
+        shards.append(shard)
+    return shards
+
+def select_relevant_document(
+    question: str,
+    summaries: Dict[str, str],
+    documents: Optional[Dict[str, str]] = None,
+    lexical_index: Optional[BM25Index] = None
+) -> Tuple[Optional[str], Dict[str, float]]:
+    """Select the most relevant document based on the question and summaries.
+
+    With many documents, only those shortlisted by shortlist_documents (with lexical_index, if given)
+    are sent to the Researcher Agent. If their summaries do not fit in one shard (shard_max_tokens and shard_max_documents of the
+    researcher_agent config), the shards are scored in parallel, up to max_concurrent_shards at once,
+    and the shard_finalists best documents of each shard go on to a final round. There are at most
+    max_rounds rounds (default 2, so the researcher takes about two shard calls); if the candidates
+    of the last round still span several shards, the best of their scores wins. The returned scores
+    of the other documents are from the last round they took part in.
+
+    A shard whose scoring fails is reported and left out; if all shards of a round fail, the first
+    error is raised. Returns None as the most relevant document if there are no documents.
+    """
+    config = st.session_state.config.get_agent_config('researcher_agent')
+    shard_max_tokens = config.get('shard_max_tokens', 16000)
+    shard_max_documents = config.get('shard_max_documents', 40)
+    shard_finalists = max(1, config.get('shard_finalists', 3))
+    max_concurrent_shards = config.get('max_concurrent_shards', 8)
+    max_rounds = max(1, config.get('max_rounds', 2))
+
+    def score_shard(shard: Dict[str, str]):
+        try:
+            return _score_documents(question, shard), None
+        except Exception as e:
+            return None, e
 
-def get_answer(question: str, document_text: str) -> str:
-    """Get answer to question using the selected document."""
+    candidates = shortlist_documents(question, summaries, documents, lexical_index)
+    if not candidates:
+        return None, {}
+
+    relevance_scores = {}
+    for round_number in range(1, max_rounds + 1):
+        shards = _shard_summaries(candidates, shard_max_tokens, shard_max_documents)
+        shard_scores = []
+        errors = []
+        for shard, (scores, error) in zip(shards, _thread_map(score_shard, shards, max_concurrent_shards)):
+            if error is not None:
+                logging.error(f"Researcher Agent failed on a shard of {len(shard)} documents: {error}")
+                st.error(f"Researcher Agent failed on {len(shard)} documents, they are skipped: {error}")
+                errors.append(error)
+                continue
+            shard_scores.append(scores)
+        if not shard_scores:
+            raise errors[0]
+
+        round_scores = {filename: score for scores in shard_scores for filename, score in scores.items()}
+        relevance_scores.update(round_scores)
+        if len(shard_scores) == 1 or round_number == max_rounds:
+            break
+
+        finalists = [
+            filename
+            for scores in shard_scores
+            for filename, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:shard_finalists]
+        ]
+        if len(finalists) >= len(round_scores):
+            # Another round would not narrow the candidates down, keep the scores of this one
+            break
+        candidates = {filename: candidates[filename] for filename in finalists}
+
+    most_relevant = max(round_scores.items(), key=lambda x: x[1])[0]
+    return most_relevant, relevance_scores
+
+def _reply_agent_messages(question: str, document_text: str) -> List[Dict]:
+    """Build the Reply Agent messages.
+
+    The system message (instructions, then the whole document) is the same bytes for a given
+    document and config, and everything that changes per question comes after it, so that
+    repeated questions on a document reuse the provider's prompt cache for the document.
+    """
     config = st.session_state.config.get_agent_config('reply_agent')
+    # Normalize line endings, so the same document uploaded from different clients gives the same prefix
+    document_text = document_text.replace("\r\n", "\n")
     prompt = config['model_prompt'] + question
+    return [
+        {"role": "system", "content": config['system_prompt'] + "\n\nDocument Context:\n" + document_text},
+        {"role": "user", "content": prompt}
+    ]
+
+def _prompt_cache_stats(usage) -> Dict[str, float]:
+    """Prompt tokens, cached prompt tokens and their ratio from a response's usage."""
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_tokens_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0
+    }
+
+def warm_up_reply_agent(document_text: str) -> Dict[str, float]:
+    """Send a one-token Reply Agent request for the document, so that the first real question on it hits the prompt cache.
+
+    The prompt cache is per deployment: with a deployment pool, only the deployment the warm-up is routed to is warmed.
+    """
+    config = st.session_state.config.get_agent_config('reply_agent')
+    response = _chat_completion(
+        'reply_agent_warm_up',
+        messages=_reply_agent_messages("", document_text),
+        temperature=config['temperature'],
+        max_tokens=1
+    )
+    return _prompt_cache_stats(response.usage)
+
+def get_answer(question: str, document_text: str, cache_stats: Optional[Dict] = None) -> str:
+    """Get answer to question using the selected document.
+
+    If cache_stats is given, it is filled with the prompt cache statistics of the call (see _prompt_cache_stats).
+    """
+    config = st.session_state.config.get_agent_config('reply_agent')
     
-    response = client.chat.completions.create(
-        model=deployment_name,
-        messages=[
-            {"role": "system", "content": config['system_prompt'] + "\n\nDocument Context:\n" + document_text},
-            {"role": "user", "content": prompt}
-        ],
+    response = _chat_completion(
+        'reply_agent',
+        messages=_reply_agent_messages(question, document_text),
         temperature=config['temperature'],
         max_tokens=config['max_tokens']
     )
+    if cache_stats is not None:
+        cache_stats.update(_prompt_cache_stats(response.usage))
     
     return response.choices[0].message.content
+
+def get_answer_stream(question: str, document_text: str, cache_stats: Optional[Dict] = None) -> Iterator[str]:
+    """Stream the answer to question using the selected document, yielding text deltas as they arrive.
+
+    If cache_stats is given, it is filled with the prompt cache statistics of the call once the stream has ended.
+    """
+    config = st.session_state.config.get_agent_config('reply_agent')
+
+    response = _chat_completion(
+        'reply_agent',
+        messages=_reply_agent_messages(question, document_text),
+        temperature=config['temperature'],
+        max_tokens=config['max_tokens'],
+        stream=True
+    )
+
+    for chunk in response:
+        # The last chunk only carries the usage of the whole call
+        if chunk.usage is not None and cache_stats is not None:
+            cache_stats.update(_prompt_cache_stats(chunk.usage))
+        # Azure sends a first chunk with only content filter results and no choices
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content